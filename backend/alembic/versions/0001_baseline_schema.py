@@ -0,0 +1,182 @@
+"""Baseline schema (tables previously created by Base.metadata.create_all)
+
+Databases created by create_all before migrations existed should be
+stamped at this revision instead of upgraded through it:
+
+    alembic stamp 0001_baseline_schema
+
+Revision ID: 0001_baseline_schema
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_baseline_schema"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+subscription_tier = sa.Enum("FREE", "PRO", "BUSINESS", "ENTERPRISE", name="subscriptiontier")
+prompt_status = sa.Enum("DRAFT", "OPTIMIZING", "COMPLETED", "FAILED", name="promptstatus")
+optimization_type = sa.Enum(
+    "TOKEN_REDUCTION", "QUALITY_ENHANCEMENT", "CLARITY_IMPROVEMENT", "MULTIMODAL", "MODEL_ADAPTATION",
+    name="optimizationtype"
+)
+prompt_type = sa.Enum("TEXT", "IMAGE", "AUDIO", "CODE", "MULTIMODAL", name="prompttype")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("first_name", sa.String(100)),
+        sa.Column("last_name", sa.String(100)),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_verified", sa.Boolean()),
+        sa.Column("subscription_tier", subscription_tier),
+        sa.Column("monthly_optimizations", sa.Integer()),
+        sa.Column("optimizations_used", sa.Integer()),
+        sa.Column("monthly_tokens", sa.Integer()),
+        sa.Column("tokens_used", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("last_login", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "templates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("template_content", sa.Text(), nullable=False),
+        sa.Column("category", sa.String(100), nullable=False),
+        sa.Column("industry", sa.String(100)),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("usage_count", sa.Integer()),
+        sa.Column("average_rating", sa.Float()),
+        sa.Column("rating_count", sa.Integer()),
+        sa.Column("is_public", sa.Boolean()),
+        sa.Column("is_featured", sa.Boolean()),
+        sa.Column("difficulty_level", sa.String(20)),
+        sa.Column("estimated_tokens", sa.Integer()),
+        sa.Column("optimization_potential", sa.Float()),
+        sa.Column("author", sa.String(255)),
+        sa.Column("version", sa.String(20)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_templates_id", "templates", ["id"])
+
+    op.create_table(
+        "prompts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("original_prompt", sa.Text(), nullable=False),
+        sa.Column("optimized_prompt", sa.Text()),
+        sa.Column("prompt_type", sa.String(50)),
+        sa.Column("title", sa.String(255)),
+        sa.Column("description", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("category", sa.String(100)),
+        sa.Column("original_tokens", sa.Integer()),
+        sa.Column("optimized_tokens", sa.Integer()),
+        sa.Column("token_reduction_percentage", sa.Float()),
+        sa.Column("clarity_score", sa.Float()),
+        sa.Column("specificity_score", sa.Float()),
+        sa.Column("overall_quality_score", sa.Float()),
+        sa.Column("status", prompt_status),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_prompts_id", "prompts", ["id"])
+
+    op.create_table(
+        "optimizations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("prompt_id", sa.Integer(), sa.ForeignKey("prompts.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("optimization_type", optimization_type, nullable=False),
+        sa.Column("model_used", sa.String(100)),
+        sa.Column("target_model", sa.String(100)),
+        sa.Column("original_prompt", sa.Text(), nullable=False),
+        sa.Column("optimized_prompt", sa.Text(), nullable=False),
+        sa.Column("original_tokens", sa.Integer(), nullable=False),
+        sa.Column("optimized_tokens", sa.Integer(), nullable=False),
+        sa.Column("token_reduction", sa.Integer()),
+        sa.Column("token_reduction_percentage", sa.Float()),
+        sa.Column("quality_score", sa.Float()),
+        sa.Column("clarity_score", sa.Float()),
+        sa.Column("specificity_score", sa.Float()),
+        sa.Column("original_cost", sa.Float()),
+        sa.Column("optimized_cost", sa.Float()),
+        sa.Column("cost_savings", sa.Float()),
+        sa.Column("cost_savings_percentage", sa.Float()),
+        sa.Column("optimization_notes", sa.Text()),
+        sa.Column("optimization_settings", sa.JSON()),
+        sa.Column("processing_time", sa.Float()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_optimizations_id", "optimizations", ["id"])
+
+    op.create_table(
+        "analytics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("total_optimizations", sa.Integer()),
+        sa.Column("total_tokens_processed", sa.Integer()),
+        sa.Column("total_tokens_saved", sa.Integer()),
+        sa.Column("total_cost", sa.Float()),
+        sa.Column("total_cost_savings", sa.Float()),
+        sa.Column("average_optimization_time", sa.Float()),
+        sa.Column("average_token_reduction", sa.Float()),
+        sa.Column("average_quality_score", sa.Float()),
+        sa.Column("model_usage", sa.JSON()),
+        sa.Column("optimization_type_usage", sa.JSON()),
+        sa.Column("successful_optimizations", sa.Integer()),
+        sa.Column("failed_optimizations", sa.Integer()),
+        sa.Column("user_satisfaction_score", sa.Float()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_analytics_id", "analytics", ["id"])
+
+    op.create_table(
+        "multimodal_prompts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("prompt_type", prompt_type, nullable=False),
+        sa.Column("text_content", sa.Text()),
+        sa.Column("image_urls", sa.JSON()),
+        sa.Column("audio_urls", sa.JSON()),
+        sa.Column("code_snippets", sa.JSON()),
+        sa.Column("title", sa.String(255)),
+        sa.Column("description", sa.Text()),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("processing_status", sa.String(50)),
+        sa.Column("processing_notes", sa.Text()),
+        sa.Column("total_tokens", sa.Integer()),
+        sa.Column("estimated_cost", sa.Float()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_multimodal_prompts_id", "multimodal_prompts", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("multimodal_prompts")
+    op.drop_table("analytics")
+    op.drop_table("optimizations")
+    op.drop_table("prompts")
+    op.drop_table("templates")
+    op.drop_table("users")
+    for enum in (prompt_type, optimization_type, prompt_status, subscription_tier):
+        enum.drop(op.get_bind(), checkfirst=True)
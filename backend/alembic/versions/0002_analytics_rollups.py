@@ -0,0 +1,50 @@
+"""Analytics rollup table
+
+Revision ID: 0002_analytics_rollups
+Revises: 0001_baseline_schema
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_analytics_rollups"
+down_revision = "0001_baseline_schema"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Deployments that ran create_all after the rollups landed already have it
+    if sa.inspect(op.get_bind()).has_table("analytics_rollups"):
+        return
+
+    op.create_table(
+        "analytics_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("scope", sa.String(20), nullable=False),
+        sa.Column("scope_id", sa.Integer(), nullable=False),
+        sa.Column("granularity", sa.String(10), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("optimizations", sa.Integer(), nullable=False),
+        sa.Column("tokens_processed", sa.BigInteger(), nullable=False),
+        sa.Column("tokens_saved", sa.BigInteger(), nullable=False),
+        sa.Column("cost", sa.Float(), nullable=False),
+        sa.Column("cost_savings", sa.Float(), nullable=False),
+        sa.Column("token_reduction_percentage_sum", sa.Float(), nullable=False),
+        sa.Column("quality_score_sum", sa.Float(), nullable=False),
+        sa.Column("successful_optimizations", sa.Integer(), nullable=False),
+        sa.Column("processing_time_sum", sa.Float(), nullable=False),
+        sa.Column("processing_time_count", sa.Integer(), nullable=False),
+        sa.Column("model_usage", postgresql.JSONB()),
+        sa.Column("optimization_type_usage", postgresql.JSONB()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("scope", "scope_id", "granularity", "bucket_start", name="uq_analytics_rollups_bucket"),
+    )
+    op.create_index("ix_analytics_rollups_id", "analytics_rollups", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("analytics_rollups")
@@ -0,0 +1,116 @@
+"""Composite indexes for per-user time-range queries
+
+Every listing and analytics query filters on user_id plus a created_at or
+date range. Indexes are built CONCURRENTLY so large tables stay writable.
+
+Revision ID: 0003_per_user_time_indexes
+Revises: 0002_analytics_rollups
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_per_user_time_indexes"
+down_revision = "0002_analytics_rollups"
+branch_labels = None
+depends_on = None
+
+
+def _merged_usage(column: str) -> str:
+    """
+    SQL summing one JSON {key: count} breakdown across a group's duplicate rows
+    """
+    return f"""(
+        SELECT json_object_agg(usage.key, usage.count)
+        FROM (
+            SELECT entry.key, sum(entry.value::numeric)::int AS count
+            FROM analytics d, json_each_text(d.{column}) AS entry
+            WHERE d.user_id = m.user_id AND d.date = m.date
+            GROUP BY entry.key
+        ) AS usage
+    )"""
+
+
+def upgrade() -> None:
+    # Fold duplicate (user_id, date) rows into the newest one: totals are
+    # summed, averages re-weighted by optimizations and breakdowns merged
+    op.execute(f"""
+        WITH m AS (
+            SELECT
+                user_id,
+                date,
+                max(id) AS keep_id,
+                sum(coalesce(total_optimizations, 0)) AS optimizations,
+                sum(coalesce(total_tokens_processed, 0)) AS tokens_processed,
+                sum(coalesce(total_tokens_saved, 0)) AS tokens_saved,
+                sum(coalesce(total_cost, 0)) AS cost,
+                sum(coalesce(total_cost_savings, 0)) AS cost_savings,
+                sum(coalesce(average_optimization_time, 0) * coalesce(total_optimizations, 0)) AS time_sum,
+                sum(coalesce(average_quality_score, 0) * coalesce(total_optimizations, 0)) AS quality_sum,
+                sum(coalesce(user_satisfaction_score, 0) * coalesce(total_optimizations, 0)) AS satisfaction_sum,
+                sum(coalesce(successful_optimizations, 0)) AS successful,
+                sum(coalesce(failed_optimizations, 0)) AS failed
+            FROM analytics
+            GROUP BY user_id, date
+            HAVING count(*) > 1
+        )
+        UPDATE analytics a SET
+            total_optimizations = m.optimizations,
+            total_tokens_processed = m.tokens_processed,
+            total_tokens_saved = m.tokens_saved,
+            total_cost = m.cost,
+            total_cost_savings = m.cost_savings,
+            average_optimization_time = coalesce(m.time_sum / nullif(m.optimizations, 0), 0),
+            average_token_reduction = coalesce(m.tokens_saved * 100.0 / nullif(m.tokens_processed, 0), 0),
+            average_quality_score = coalesce(m.quality_sum / nullif(m.optimizations, 0), 0),
+            user_satisfaction_score = coalesce(m.satisfaction_sum / nullif(m.optimizations, 0), 0),
+            successful_optimizations = m.successful,
+            failed_optimizations = m.failed,
+            model_usage = {_merged_usage("model_usage")},
+            optimization_type_usage = {_merged_usage("optimization_type_usage")},
+            updated_at = now()
+        FROM m
+        WHERE a.id = m.keep_id
+    """)
+
+    # Then drop the merged rows so the unique constraint can be added
+    op.execute("""
+        DELETE FROM analytics a
+        USING analytics b
+        WHERE a.user_id = b.user_id
+          AND a.date = b.date
+          AND a.id < b.id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_optimizations_user_created "
+            "ON optimizations (user_id, created_at DESC, id DESC)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_prompts_user_created "
+            "ON prompts (user_id, created_at DESC, id DESC)"
+        )
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_analytics_user_date "
+            "ON analytics (user_id, date)"
+        )
+
+    # Promote the unique index to the constraint upserts target (no table rescan)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_analytics_user_date') THEN
+                ALTER TABLE analytics
+                    ADD CONSTRAINT uq_analytics_user_date UNIQUE USING INDEX uq_analytics_user_date;
+            END IF;
+        END $$;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_analytics_user_date", "analytics", type_="unique")
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_prompts_user_created")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_optimizations_user_created")
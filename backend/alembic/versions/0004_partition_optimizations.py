@@ -0,0 +1,114 @@
+"""Partition optimizations by month and add the archive manifest
+
+Converts optimizations into a RANGE (created_at) partitioned table with one
+partition per month plus a default partition. The primary key becomes
+(id, created_at) as PostgreSQL requires the partition key in unique keys;
+the id sequence is kept so existing ids remain valid.
+
+Revision ID: 0004_partition_optimizations
+Revises: 0003_per_user_time_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_partition_optimizations"
+down_revision = "0003_per_user_time_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE optimizations RENAME TO optimizations_unpartitioned")
+    op.execute("ALTER INDEX optimizations_pkey RENAME TO optimizations_unpartitioned_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_optimizations_user_created RENAME TO ix_optimizations_unpartitioned_user_created")
+    op.execute("ALTER SEQUENCE optimizations_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE optimizations (
+            LIKE optimizations_unpartitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (prompt_id) REFERENCES prompts (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE optimizations ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER SEQUENCE optimizations_id_seq OWNED BY optimizations.id")
+
+    # Month bounds at UTC midnight, like OptimizationArchiveService.ensure_partitions,
+    # whatever the database's TimeZone; otherwise the service's first partition overlaps
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+
+    # One partition per month from the oldest row through two months ahead
+    op.execute("""
+        DO $$
+        DECLARE
+            month_start date := date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM optimizations_unpartitioned), now()
+            ));
+            last_month date := date_trunc('month', now() + interval '2 months');
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF optimizations FOR VALUES FROM (%L) TO (%L)',
+                    'optimizations_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+                    month_start,
+                    month_start + interval '1 month'
+                );
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE optimizations_default PARTITION OF optimizations DEFAULT")
+
+    op.execute("""
+        INSERT INTO optimizations
+        SELECT * FROM optimizations_unpartitioned WHERE created_at IS NOT NULL
+    """)
+    op.execute("DROP TABLE optimizations_unpartitioned")
+
+    op.create_index("ix_optimizations_id", "optimizations", ["id"])
+    op.execute(
+        "CREATE INDEX ix_optimizations_user_created "
+        "ON optimizations (user_id, created_at DESC, id DESC)"
+    )
+
+    op.create_table(
+        "optimization_archives",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("partition_name", sa.String(63), nullable=False, unique=True),
+        sa.Column("range_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("range_end", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("path", sa.String(1024), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_optimization_archives_id", "optimization_archives", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("optimization_archives")
+
+    op.execute("ALTER TABLE optimizations RENAME TO optimizations_partitioned")
+    op.execute("ALTER INDEX optimizations_pkey RENAME TO optimizations_partitioned_pkey")
+    op.execute("ALTER INDEX ix_optimizations_id RENAME TO ix_optimizations_partitioned_id")
+    op.execute("ALTER INDEX ix_optimizations_user_created RENAME TO ix_optimizations_partitioned_user_created")
+    op.execute("ALTER SEQUENCE optimizations_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE optimizations (
+            LIKE optimizations_partitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id),
+            FOREIGN KEY (prompt_id) REFERENCES prompts (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE optimizations_id_seq OWNED BY optimizations.id")
+    op.execute("INSERT INTO optimizations SELECT * FROM optimizations_partitioned")
+    op.execute("DROP TABLE optimizations_partitioned CASCADE")
+    op.create_index("ix_optimizations_id", "optimizations", ["id"])
+    op.execute(
+        "CREATE INDEX ix_optimizations_user_created "
+        "ON optimizations (user_id, created_at DESC, id DESC)"
+    )
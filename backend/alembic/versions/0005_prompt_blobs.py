@@ -0,0 +1,117 @@
+"""Store prompt bodies once in content-addressed prompt_blobs
+
+Replaces the original_prompt/optimized_prompt text columns of prompts and
+optimizations with *_hash references to prompt_blobs (SHA-256 of the UTF-8
+text). Bodies above PROMPT_BLOB_COMPRESSION_THRESHOLD are zstd-compressed.
+
+Revision ID: 0005_prompt_blobs
+Revises: 0004_partition_optimizations
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.prompt_blob import COMPRESSION_NONE, COMPRESSION_ZSTD, decode_content, encode_content
+
+
+# revision identifiers, used by Alembic.
+revision = "0005_prompt_blobs"
+down_revision = "0004_partition_optimizations"
+branch_labels = None
+depends_on = None
+
+
+BLOB_COLUMNS = (
+    ("prompts", "original_prompt", False),
+    ("prompts", "optimized_prompt", True),
+    ("optimizations", "original_prompt", False),
+    ("optimizations", "optimized_prompt", False),
+)
+
+BATCH_SIZE = 1000
+
+
+def _recode_blobs(from_compression: str, recode) -> None:
+    """
+    Rewrite blobs stored with `from_compression` in hash order, one batch at a time
+    """
+    connection = op.get_bind()
+    last_hash = ""
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT hash, compression, data FROM prompt_blobs "
+            "WHERE compression = :compression AND hash > :last_hash "
+            "ORDER BY hash LIMIT :limit"
+        ), {"compression": from_compression, "last_hash": last_hash, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+
+        for hash, compression, data in rows:
+            compression, data = recode(compression, data)
+            connection.execute(sa.text(
+                "UPDATE prompt_blobs SET compression = :compression, data = :data WHERE hash = :hash"
+            ), {"compression": compression, "data": data, "hash": hash})
+        last_hash = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_blobs",
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("compression", sa.String(10), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    for table, column, _ in BLOB_COLUMNS:
+        op.add_column(table, sa.Column(f"{column}_hash", sa.String(64)))
+        op.execute(f"""
+            UPDATE {table}
+            SET {column}_hash = encode(sha256(convert_to({column}, 'UTF8')), 'hex')
+            WHERE {column} IS NOT NULL
+        """)
+        op.execute(f"""
+            INSERT INTO prompt_blobs (hash, compression, size, data)
+            SELECT DISTINCT ON ({column}_hash)
+                {column}_hash, '{COMPRESSION_NONE}', octet_length(convert_to({column}, 'UTF8')), convert_to({column}, 'UTF8')
+            FROM {table}
+            WHERE {column} IS NOT NULL
+            ON CONFLICT (hash) DO NOTHING
+        """)
+
+    # Compress the backfilled bodies the same way the application does
+    def compress(compression, data):
+        compression, _, data = encode_content(bytes(data).decode("utf-8"))
+        return compression, data
+
+    _recode_blobs(COMPRESSION_NONE, compress)
+
+    for table, column, nullable in BLOB_COLUMNS:
+        if not nullable:
+            op.alter_column(table, f"{column}_hash", nullable=False)
+        op.create_foreign_key(
+            f"fk_{table}_{column}_hash", table, "prompt_blobs", [f"{column}_hash"], ["hash"]
+        )
+        op.drop_column(table, column)
+
+
+def downgrade() -> None:
+    _recode_blobs(COMPRESSION_ZSTD, lambda compression, data: (
+        COMPRESSION_NONE, decode_content(compression, data).encode("utf-8")
+    ))
+
+    for table, column, nullable in BLOB_COLUMNS:
+        op.add_column(table, sa.Column(column, sa.Text()))
+        op.execute(f"""
+            UPDATE {table}
+            SET {column} = convert_from(prompt_blobs.data, 'UTF8')
+            FROM prompt_blobs
+            WHERE prompt_blobs.hash = {table}.{column}_hash
+        """)
+        if not nullable:
+            op.alter_column(table, column, nullable=False)
+        op.drop_constraint(f"fk_{table}_{column}_hash", table, type_="foreignkey")
+        op.drop_column(table, f"{column}_hash")
+
+    op.drop_table("prompt_blobs")
@@ -0,0 +1,26 @@
+"""Keep the AI component of prompt quality scores
+
+Stores the LLM judge's score next to the rule-based ones so the overall
+score can be recomputed when QUALITY_SCORE_WEIGHTS change.
+
+Revision ID: 0006_prompt_ai_quality_score
+Revises: 0005_prompt_blobs
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_prompt_ai_quality_score"
+down_revision = "0005_prompt_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("prompts", sa.Column("ai_quality_score", sa.Float()))
+
+
+def downgrade() -> None:
+    op.drop_column("prompts", "ai_quality_score")
@@ -0,0 +1,26 @@
+"""Record per-stage timings of optimizations
+
+Stores how long the rewrite, token counting and quality assessment of each
+optimization took, so the slowest stage of the pipeline can be tracked.
+
+Revision ID: 0007_optimization_stage_timings
+Revises: 0006_prompt_ai_quality_score
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007_optimization_stage_timings"
+down_revision = "0006_prompt_ai_quality_score"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("optimizations", sa.Column("stage_timings", sa.JSON()))
+
+
+def downgrade() -> None:
+    op.drop_column("optimizations", "stage_timings")
@@ -2,11 +2,11 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from app.core.config import settings
-from app.core.database import get_db
-from app.core.security import create_access_token, get_password_hash, verify_password, get_current_user
+from app.core.database import get_async_db
+from app.core.security import create_access_token, get_current_user, password_hasher, user_claims
 from app.models.user import User
 from app.schemas.auth import Token, UserCreate, UserResponse
 from app.schemas.user import User as UserSchema
@@ -15,20 +15,20 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     """
     Register a new user
     """
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = (await db.execute(select(User).where(User.email == user_data.email))).scalar_one_or_none()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Create new user (bcrypt runs on the bounded hashing pool)
+    hashed_password = await password_hasher.hash(user_data.password)
     db_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
@@ -37,8 +37,8 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return UserResponse(
         id=db_user.id,
@@ -52,16 +52,19 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Login user and return access token
     """
     # Find user by email
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalar_one_or_none()
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -77,12 +80,14 @@ def login(
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=user_claims(user), expires_delta=access_token_expires
     )
     
-    # Update last login
-    user.last_login = db.query(func.now()).scalar()
-    db.commit()
+    # Update last login, upgrading the stored hash if its parameters are outdated
+    user.last_login = (await db.execute(select(func.now()))).scalar()
+    if new_hash:
+        user.hashed_password = new_hash
+    await db.commit()
     
     return {
         "access_token": access_token,
@@ -101,16 +106,15 @@ def login(
 
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def refresh_token(
+    current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Refresh access token
     """
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": current_user.email}, expires_delta=access_token_expires
+        data=user_claims(current_user), expires_delta=access_token_expires
     )
     
     return {
@@ -1,67 +1,110 @@
+import json
+from uuid import uuid4
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.core.replicas import get_async_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER, paginate_keyset, parse_fields, split_page
+from app.core.security import get_current_active_user, get_current_principal, resolve_principal
 from app.models.user import User
-from app.models.prompt import Prompt, Optimization, OptimizationType
-from app.schemas.prompt import OptimizationRequest, OptimizationResponse
-from app.services.optimization_service import OptimizationService
+from app.models.prompt import Prompt, Optimization, OptimizationType, load_prompt_text
+from app.schemas.auth import Principal
+from app.schemas.prompt import OptimizationRequest, OptimizationResponse, OptimizationSummary
+from app.core.services import get_token_service
+from app.services.quota_service import quota_service
+from app.services.task_status_service import TaskStatusService
 from app.services.token_service import TokenService
 from app.tasks.optimization_tasks import optimize_prompt_task
 
 router = APIRouter()
 
+task_status_service = TaskStatusService()
+
+
+def _check_task_owner(event: Optional[dict], user_id: int):
+    """Hide tasks that belong to other users"""
+    if event is not None and event.get("user_id") not in (None, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+
 
 @router.post("/", response_model=OptimizationResponse)
 async def optimize_prompt(
     optimization_request: OptimizationRequest,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    token_service: TokenService = Depends(get_token_service)
 ) -> Any:
     """
     Optimize a prompt using AI
     """
-    # Check user limits
-    estimated_tokens = len(optimization_request.original_prompt.split()) * 1.3  # Rough estimate
-    if not current_user.can_optimize(int(estimated_tokens)):
+    # Reserve quota for the prompt plus an optimized version at most as long,
+    # once per candidate; the task replaces the reservation with the tokens actually used
+    task_id = str(uuid4())
+    estimated_tokens = 2 * optimization_request.candidates * token_service.count_tokens(
+        optimization_request.original_prompt,
+        (optimization_request.candidate_models or [optimization_request.target_model or settings.DEFAULT_MODEL])[0]
+    )
+    if not await quota_service.reserve(current_user, task_id, estimated_tokens):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Optimization limit reached. Please upgrade your plan."
         )
     
-    # Get or create prompt
-    if optimization_request.prompt_id:
-        prompt = db.query(Prompt).filter(
-            Prompt.id == optimization_request.prompt_id,
-            Prompt.user_id == current_user.id
-        ).first()
-        if not prompt:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Prompt not found"
+    try:
+        # Get or create prompt
+        if optimization_request.prompt_id:
+            prompt = (await db.execute(
+                select(Prompt).where(
+                    Prompt.id == optimization_request.prompt_id,
+                    Prompt.user_id == current_user.id
+                )
+            )).scalar_one_or_none()
+            if not prompt:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Prompt not found"
+                )
+        else:
+            # Create new prompt
+            prompt = Prompt(
+                user_id=current_user.id,
+                original_prompt=optimization_request.original_prompt,
+                status="draft"
             )
-    else:
-        # Create new prompt
-        prompt = Prompt(
-            user_id=current_user.id,
-            original_prompt=optimization_request.original_prompt,
-            status="draft"
+            db.add(prompt)
+            await db.commit()
+        
+        # Record the pending state before enqueueing so the worker's first
+        # transition can never be overwritten by it
+        task_status_service.publish(task_id, "PENDING", user_id=current_user.id)
+        
+        # Start optimization in background
+        task = optimize_prompt_task.apply_async(
+            kwargs=dict(
+                prompt_id=prompt.id,
+                user_id=current_user.id,
+                optimization_type=optimization_request.optimization_type,
+                target_model=optimization_request.target_model,
+                reduction_target=optimization_request.reduction_target,
+                quality_threshold=optimization_request.quality_threshold,
+                candidates=optimization_request.candidates,
+                candidate_models=optimization_request.candidate_models,
+                reservation_id=task_id
+            ),
+            task_id=task_id
         )
-        db.add(prompt)
-        db.commit()
-        db.refresh(prompt)
-    
-    # Start optimization in background
-    task = optimize_prompt_task.delay(
-        prompt_id=prompt.id,
-        user_id=current_user.id,
-        optimization_type=optimization_request.optimization_type,
-        target_model=optimization_request.target_model,
-        reduction_target=optimization_request.reduction_target,
-        quality_threshold=optimization_request.quality_threshold
-    )
+    except Exception:
+        await quota_service.release(current_user, task_id)
+        raise
     
     # Return immediate response with task ID
     return {
@@ -74,70 +117,156 @@ async def optimize_prompt(
 @router.get("/task/{task_id}")
 async def get_optimization_status(
     task_id: str,
-    current_user: User = Depends(get_current_active_user)
+    wait: int = Query(0, ge=0, le=settings.TASK_STATUS_MAX_WAIT),
+    since: Optional[str] = Query(None, description="Last status seen by the client"),
+    current_user: Principal = Depends(get_current_principal)
 ) -> Any:
     """
-    Get optimization task status
+    Get optimization task status.
+
+    With wait > 0 the request long-polls: it returns as soon as the status
+    differs from `since` (or the task finishes) or after `wait` seconds.
     """
-    from app.core.celery_app import celery_app
-    
-    task_result = celery_app.AsyncResult(task_id)
+    event = await task_status_service.wait_for_change(task_id, since, timeout=wait)
     
-    if task_result.ready():
-        if task_result.successful():
-            result = task_result.result
-            return {
-                "status": "completed",
-                "result": result
-            }
-        else:
-            return {
-                "status": "failed",
-                "error": str(task_result.info)
-            }
-    else:
+    if event is None:
+        # No published state (e.g. expired), fall back to the result backend;
+        # only a completed result naming its owner can be attributed to a user
+        from app.core.celery_app import celery_app
+        
+        task_result = celery_app.AsyncResult(task_id)
+        result = task_result.result if task_result.successful() else None
+        if not isinstance(result, dict) or result.get("user_id") != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task not found"
+            )
         return {
-            "status": "processing",
-            "task_id": task_id
+            "status": "completed",
+            "result": result
         }
+    
+    _check_task_owner(event, current_user.id)
+    return task_status_service.to_response(event)
+
+
+@router.get("/task/{task_id}/events")
+async def stream_optimization_status(
+    task_id: str,
+    current_user: Principal = Depends(get_current_principal)
+) -> Any:
+    """
+    Stream optimization task status as Server-Sent Events
+    """
+    _check_task_owner(await task_status_service.get_status(task_id), current_user.id)
+    
+    async def event_stream():
+        async for event in task_status_service.stream(task_id):
+            payload = task_status_service.to_response(event)
+            yield f"event: {payload['status']}\ndata: {json.dumps(payload, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/task/{task_id}/ws")
+async def websocket_optimization_status(
+    websocket: WebSocket,
+    task_id: str,
+    token: str = Query(...)
+):
+    """
+    Push optimization task status over a WebSocket.
+
+    Browsers cannot set headers on WebSocket handshakes, so the access token
+    is passed as a query parameter.
+    """
+    # Short-lived session: the socket may stay open for minutes
+    async with AsyncSessionLocal() as db:
+        user = await resolve_principal(token, db)
+    if user is None or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    event = await task_status_service.get_status(task_id)
+    if event is not None and event.get("user_id") not in (None, user.id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    try:
+        async for event in task_status_service.stream(task_id):
+            await websocket.send_text(json.dumps(task_status_service.to_response(event), default=str))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 
 @router.get("/", response_model=List[OptimizationResponse])
 async def get_optimizations(
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header"),
     limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = Query(None, description='"summary" or a comma-separated list of OptimizationSummary fields'),
+    skip: int = Query(0, ge=0, deprecated=True),
     optimization_type: Optional[OptimizationType] = None,
     model_used: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
-    Get user's optimization history
+    Get user's optimization history, newest first.
+
+    Pages are cursor-based: pass the X-Next-Cursor header of one page as
+    `cursor` to get the next. With `fields`, only the selected columns are
+    loaded and returned.
     """
-    query = db.query(Optimization).filter(Optimization.user_id == current_user.id)
+    columns = parse_fields(fields, OptimizationSummary.model_fields, OptimizationSummary.model_fields)
+    
+    if columns:
+        query = select(*[getattr(Optimization, column) for column in columns])
+    else:
+        query = select(Optimization).options(*load_prompt_text(Optimization))
+    query = query.where(Optimization.user_id == current_user.id)
     
     if optimization_type:
-        query = query.filter(Optimization.optimization_type == optimization_type)
+        query = query.where(Optimization.optimization_type == optimization_type)
     if model_used:
-        query = query.filter(Optimization.model_used == model_used)
+        query = query.where(Optimization.model_used == model_used)
+    
+    query = paginate_keyset(query, Optimization, cursor, limit)
+    if skip and not cursor:
+        query = query.offset(skip)
     
-    optimizations = query.order_by(Optimization.created_at.desc()).offset(skip).limit(limit).all()
+    result = await db.execute(query)
+    optimizations, next_cursor = split_page(result.all() if columns else result.scalars().all(), limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    
+    if columns:
+        return JSONResponse(jsonable_encoder([dict(row._mapping) for row in optimizations]), headers=headers)
+    
+    response.headers.update(headers)
     return [OptimizationResponse.from_orm(opt) for opt in optimizations]
 
 
 @router.get("/{optimization_id}", response_model=OptimizationResponse)
 async def get_optimization(
     optimization_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get a specific optimization by ID
     """
-    optimization = db.query(Optimization).filter(
-        Optimization.id == optimization_id,
-        Optimization.user_id == current_user.id
-    ).first()
+    optimization = (await db.execute(
+        select(Optimization).options(*load_prompt_text(Optimization)).where(
+            Optimization.id == optimization_id,
+            Optimization.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not optimization:
         raise HTTPException(
@@ -152,12 +281,12 @@ async def get_optimization(
 async def calculate_tokens(
     text: str,
     model: str = "gpt-4",
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_principal),
+    token_service: TokenService = Depends(get_token_service)
 ) -> Any:
     """
     Calculate token count and estimated cost for a text
     """
-    token_service = TokenService()
     token_count = token_service.count_tokens(text, model)
     estimated_cost = token_service.calculate_cost(token_count, model)
     
@@ -173,12 +302,12 @@ async def calculate_tokens(
 async def compare_models(
     text: str,
     models: List[str] = ["gpt-4", "gpt-3.5-turbo", "claude-3-sonnet"],
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_principal),
+    token_service: TokenService = Depends(get_token_service)
 ) -> Any:
     """
     Compare token count and cost across different models
     """
-    token_service = TokenService()
     comparison = []
     
     for model in models:
@@ -199,16 +328,18 @@ async def compare_models(
 @router.delete("/{optimization_id}")
 async def delete_optimization(
     optimization_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Delete an optimization
     """
-    optimization = db.query(Optimization).filter(
-        Optimization.id == optimization_id,
-        Optimization.user_id == current_user.id
-    ).first()
+    optimization = (await db.execute(
+        select(Optimization).where(
+            Optimization.id == optimization_id,
+            Optimization.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not optimization:
         raise HTTPException(
@@ -216,7 +347,7 @@ async def delete_optimization(
             detail="Optimization not found"
         )
     
-    db.delete(optimization)
-    db.commit()
+    await db.delete(optimization)
+    await db.commit()
     
     return {"message": "Optimization deleted successfully"} 
\ No newline at end of file
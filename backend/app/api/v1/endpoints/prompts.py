@@ -1,26 +1,33 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.replicas import get_async_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER, paginate_keyset, parse_fields, split_page
+from app.core.security import get_current_active_user, get_current_principal
 from app.models.user import User
-from app.models.prompt import Prompt, PromptStatus
-from app.schemas.prompt import PromptCreate, PromptUpdate, PromptResponse, PromptList
+from app.models.prompt import Prompt, PromptStatus, Optimization, load_prompt_text
+from app.schemas.auth import Principal
+from app.schemas.prompt import PromptCreate, PromptUpdate, PromptResponse, PromptList, PromptSummary
+from app.services.quota_service import quota_service
 
 router = APIRouter()
 
 
 @router.post("/", response_model=PromptResponse)
-def create_prompt(
+async def create_prompt(
     prompt_data: PromptCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Create a new prompt
     """
     # Check user limits
-    if not current_user.can_optimize():
+    if not await quota_service.can_optimize(current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Optimization limit reached. Please upgrade your plan."
@@ -37,48 +44,73 @@ def create_prompt(
     )
     
     db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
+    await db.commit()
     
     return PromptResponse.from_orm(db_prompt)
 
 
 @router.get("/", response_model=List[PromptResponse])
-def get_prompts(
-    skip: int = Query(0, ge=0),
+async def get_prompts(
+    response: Response,
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header"),
     limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = Query(None, description='"summary" or a comma-separated list of PromptSummary fields'),
+    skip: int = Query(0, ge=0, deprecated=True),
     status: Optional[PromptStatus] = None,
     category: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
-    Get user's prompts with optional filtering
+    Get user's prompts with optional filtering, newest first.
+
+    Pages are cursor-based: pass the X-Next-Cursor header of one page as
+    `cursor` to get the next. With `fields`, only the selected columns are
+    loaded and returned.
     """
-    query = db.query(Prompt).filter(Prompt.user_id == current_user.id)
+    columns = parse_fields(fields, PromptSummary.model_fields, PromptSummary.model_fields)
+    
+    if columns:
+        query = select(*[getattr(Prompt, column) for column in columns])
+    else:
+        query = select(Prompt).options(*load_prompt_text(Prompt))
+    query = query.where(Prompt.user_id == current_user.id)
     
     if status:
-        query = query.filter(Prompt.status == status)
+        query = query.where(Prompt.status == status)
     if category:
-        query = query.filter(Prompt.category == category)
+        query = query.where(Prompt.category == category)
+    
+    query = paginate_keyset(query, Prompt, cursor, limit)
+    if skip and not cursor:
+        query = query.offset(skip)
     
-    prompts = query.offset(skip).limit(limit).all()
+    result = await db.execute(query)
+    prompts, next_cursor = split_page(result.all() if columns else result.scalars().all(), limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    
+    if columns:
+        return JSONResponse(jsonable_encoder([dict(row._mapping) for row in prompts]), headers=headers)
+    
+    response.headers.update(headers)
     return [PromptResponse.from_orm(prompt) for prompt in prompts]
 
 
 @router.get("/{prompt_id}", response_model=PromptResponse)
-def get_prompt(
+async def get_prompt(
     prompt_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get a specific prompt by ID
     """
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.user_id == current_user.id
-    ).first()
+    prompt = (await db.execute(
+        select(Prompt).options(*load_prompt_text(Prompt)).where(
+            Prompt.id == prompt_id,
+            Prompt.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not prompt:
         raise HTTPException(
@@ -90,19 +122,21 @@ def get_prompt(
 
 
 @router.put("/{prompt_id}", response_model=PromptResponse)
-def update_prompt(
+async def update_prompt(
     prompt_id: int,
     prompt_data: PromptUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Update a prompt
     """
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.user_id == current_user.id
-    ).first()
+    prompt = (await db.execute(
+        select(Prompt).options(*load_prompt_text(Prompt)).where(
+            Prompt.id == prompt_id,
+            Prompt.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not prompt:
         raise HTTPException(
@@ -114,25 +148,26 @@ def update_prompt(
     for field, value in prompt_data.dict(exclude_unset=True).items():
         setattr(prompt, field, value)
     
-    db.commit()
-    db.refresh(prompt)
+    await db.commit()
     
     return PromptResponse.from_orm(prompt)
 
 
 @router.delete("/{prompt_id}")
-def delete_prompt(
+async def delete_prompt(
     prompt_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Delete a prompt
     """
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.user_id == current_user.id
-    ).first()
+    prompt = (await db.execute(
+        select(Prompt).where(
+            Prompt.id == prompt_id,
+            Prompt.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not prompt:
         raise HTTPException(
@@ -140,25 +175,27 @@ def delete_prompt(
             detail="Prompt not found"
         )
     
-    db.delete(prompt)
-    db.commit()
+    await db.delete(prompt)
+    await db.commit()
     
     return {"message": "Prompt deleted successfully"}
 
 
 @router.get("/{prompt_id}/history", response_model=List[dict])
-def get_prompt_history(
+async def get_prompt_history(
     prompt_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get optimization history for a prompt
     """
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.user_id == current_user.id
-    ).first()
+    prompt = (await db.execute(
+        select(Prompt).where(
+            Prompt.id == prompt_id,
+            Prompt.user_id == current_user.id
+        )
+    )).scalar_one_or_none()
     
     if not prompt:
         raise HTTPException(
@@ -167,7 +204,9 @@ def get_prompt_history(
         )
     
     # Get optimization history
-    optimizations = prompt.optimizations
+    optimizations = (await db.execute(
+        select(Optimization).where(Optimization.prompt_id == prompt.id)
+    )).scalars().all()
     history = []
     
     for opt in optimizations:
@@ -1,10 +1,12 @@
 from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import get_current_active_user
-from app.models.user import User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.replicas import get_async_read_db
+from app.core.security import get_current_principal
 from app.models.template import Template
+from app.schemas.auth import Principal
 from app.schemas.template import TemplateCreate, TemplateResponse, TemplateList
 
 router = APIRouter()
@@ -18,61 +20,63 @@ async def get_templates(
     industry: Optional[str] = None,
     difficulty_level: Optional[str] = None,
     is_featured: Optional[bool] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get available templates with optional filtering
     """
-    query = db.query(Template).filter(Template.is_public == True)
+    query = select(Template).where(Template.is_public == True)
     
     if category:
-        query = query.filter(Template.category == category)
+        query = query.where(Template.category == category)
     if industry:
-        query = query.filter(Template.industry == industry)
+        query = query.where(Template.industry == industry)
     if difficulty_level:
-        query = query.filter(Template.difficulty_level == difficulty_level)
+        query = query.where(Template.difficulty_level == difficulty_level)
     if is_featured is not None:
-        query = query.filter(Template.is_featured == is_featured)
+        query = query.where(Template.is_featured == is_featured)
     
-    templates = query.order_by(Template.usage_count.desc()).offset(skip).limit(limit).all()
+    templates = (await db.execute(
+        query.order_by(Template.usage_count.desc()).offset(skip).limit(limit)
+    )).scalars().all()
     return [TemplateResponse.from_orm(template) for template in templates]
 
 
 @router.get("/categories")
 async def get_template_categories(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get available template categories
     """
-    categories = db.query(Template.category).distinct().all()
-    return [category[0] for category in categories if category[0]]
+    categories = (await db.execute(select(Template.category).distinct())).scalars().all()
+    return [category for category in categories if category]
 
 
 @router.get("/industries")
 async def get_template_industries(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get available template industries
     """
-    industries = db.query(Template.industry).distinct().all()
-    return [industry[0] for industry in industries if industry[0]]
+    industries = (await db.execute(select(Template.industry).distinct())).scalars().all()
+    return [industry for industry in industries if industry]
 
 
 @router.get("/{template_id}", response_model=TemplateResponse)
 async def get_template(
     template_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Get a specific template by ID
     """
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template = await db.get(Template, template_id)
     
     if not template:
         raise HTTPException(
@@ -88,7 +92,7 @@ async def get_template(
     
     # Increment usage count
     template.increment_usage()
-    db.commit()
+    await db.commit()
     
     return TemplateResponse.from_orm(template)
 
@@ -97,8 +101,8 @@ async def get_template(
 async def rate_template(
     template_id: int,
     rating: float,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Rate a template (1-5 stars)
@@ -109,7 +113,7 @@ async def rate_template(
             detail="Rating must be between 1 and 5"
         )
     
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template = await db.get(Template, template_id)
     
     if not template:
         raise HTTPException(
@@ -118,7 +122,7 @@ async def rate_template(
         )
     
     template.add_rating(rating)
-    db.commit()
+    await db.commit()
     
     return {"message": "Rating submitted successfully"}
 
@@ -126,15 +130,17 @@ async def rate_template(
 @router.get("/featured", response_model=List[TemplateResponse])
 async def get_featured_templates(
     limit: int = Query(10, ge=1, le=50),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Any:
     """
     Get featured templates
     """
-    templates = db.query(Template).filter(
-        Template.is_public == True,
-        Template.is_featured == True
-    ).order_by(Template.usage_count.desc()).limit(limit).all()
+    templates = (await db.execute(
+        select(Template).where(
+            Template.is_public == True,
+            Template.is_featured == True
+        ).order_by(Template.usage_count.desc()).limit(limit)
+    )).scalars().all()
     
     return [TemplateResponse.from_orm(template) for template in templates] 
\ No newline at end of file
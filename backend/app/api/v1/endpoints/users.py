@@ -1,10 +1,11 @@
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.core.security import get_current_active_user
 from app.models.user import User
 from app.schemas.user import UserProfile, UserUpdate
+from app.services.quota_service import quota_service
 
 router = APIRouter()
 
@@ -23,7 +24,7 @@ async def get_current_user_profile(
 async def update_current_user_profile(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Update current user profile
@@ -32,8 +33,8 @@ async def update_current_user_profile(
     for field, value in user_data.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return UserProfile.from_orm(current_user)
 
@@ -45,17 +46,22 @@ async def get_user_usage(
     """
     Get current user usage statistics
     """
+    # Live usage; the users row lags behind until the next quota flush
+    usage = await quota_service.usage(current_user)
+    
     return {
         "subscription_tier": current_user.subscription_tier,
-        "monthly_optimizations": current_user.monthly_optimizations,
-        "optimizations_used": current_user.optimizations_used,
-        "optimizations_remaining": current_user.optimizations_remaining,
-        "monthly_tokens": current_user.monthly_tokens,
-        "tokens_used": current_user.tokens_used,
-        "tokens_remaining": current_user.tokens_remaining,
+        "monthly_optimizations": usage["monthly_optimizations"],
+        "optimizations_used": usage["optimizations_used"],
+        "optimizations_reserved": usage["optimizations_reserved"],
+        "optimizations_remaining": max(0, usage["monthly_optimizations"] - usage["optimizations_used"]),
+        "monthly_tokens": usage["monthly_tokens"],
+        "tokens_used": usage["tokens_used"],
+        "tokens_reserved": usage["tokens_reserved"],
+        "tokens_remaining": max(0, usage["monthly_tokens"] - usage["tokens_used"]),
         "usage_percentage": {
-            "optimizations": (current_user.optimizations_used / current_user.monthly_optimizations) * 100,
-            "tokens": (current_user.tokens_used / current_user.monthly_tokens) * 100
+            "optimizations": (usage["optimizations_used"] / usage["monthly_optimizations"]) * 100,
+            "tokens": (usage["tokens_used"] / usage["monthly_tokens"]) * 100
         }
     }
 
@@ -63,16 +69,19 @@ async def get_user_usage(
 @router.post("/me/reset-usage")
 async def reset_user_usage(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Reset user usage (admin only or for testing)
     """
     # This would typically be called by a scheduled task
     # For now, we'll allow manual reset for testing
+    # Redis first, so a concurrent flush cannot write the old usage back
+    await quota_service.reset(current_user.id)
+    
     current_user.optimizations_used = 0
     current_user.tokens_used = 0
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Usage reset successfully"} 
\ No newline at end of file
@@ -1,4 +1,6 @@
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_process_init
 from app.core.config import settings
 
 # Create Celery app
@@ -37,6 +39,33 @@ celery_app.conf.update(
     task_default_routing_key="default",
 )
 
+# Periodic tasks (celery beat)
+celery_app.conf.beat_schedule = {
+    # Correct any drift in the incrementally maintained rollups
+    "rebuild-analytics-rollups": {
+        "task": "app.tasks.analytics_tasks.rebuild_analytics_rollups_task",
+        "schedule": crontab(hour=0, minute=30),
+        "kwargs": {"days": 2},
+    },
+    # Persist usage quotas reserved and recorded in Redis
+    "flush-usage-quotas": {
+        "task": "app.tasks.optimization_tasks.flush_usage_quotas_task",
+        "schedule": 60.0,
+    },
+    # Create upcoming optimizations partitions and archive cold ones
+    "maintain-optimization-partitions": {
+        "task": "app.tasks.analytics_tasks.maintain_optimization_partitions_task",
+        "schedule": crontab(hour=1, minute=0),
+    },
+}
+
+# Build process-wide services in each worker process, after the fork, so HTTP
+# clients and their connection pools are never shared between processes
+@worker_process_init.connect
+def init_worker_services(**kwargs):
+    from app.core.services import init_services
+    init_services()
+
 # Optional: Configure result backend for better performance
 if settings.ENVIRONMENT == "production":
     celery_app.conf.update(
@@ -1,29 +1,100 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 import redis
+import redis.asyncio as aioredis
 from app.core.config import settings
 
+def make_engine(url: str):
+    """Sync (psycopg2) engine; Celery workers, migrations and scripts"""
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.DB_WORKER_POOL_SIZE,
+        max_overflow=settings.DB_WORKER_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        echo=settings.DEBUG,
+    )
+
+
+def make_async_engine(url: str):
+    """Async (asyncpg) engine; API request path"""
+    return create_async_engine(
+        make_url(url).set(drivername="postgresql+asyncpg").update_query_dict({
+            "prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)
+        }),
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.DB_API_POOL_SIZE,
+        max_overflow=settings.DB_API_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        echo=settings.DEBUG,
+    )
+
+
+# session.info flag set on the sync Session behind every AsyncSession
+ASYNC_SESSION = "async_session"
+
+# Coroutines run after every AsyncSession commit, given the session's info
+_after_async_commit_hooks = []
+
+
+def after_async_commit(hook):
+    """Register a coroutine to run after every AsyncSession commit"""
+    _after_async_commit_hooks.append(hook)
+    return hook
+
+
+class HookedAsyncSession(AsyncSession):
+    """
+    AsyncSession that finishes post-commit work on the event loop.
+
+    Sync after_commit listeners also fire under an AsyncSession, where a
+    blocking Redis call would stall every request on the loop. Listeners
+    skip sessions flagged ASYNC_SESSION and leave what they collected in
+    session.info for their after_async_commit hook, which runs once the
+    commit returns.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.info[ASYNC_SESSION] = True
+
+    async def commit(self):
+        await super().commit()
+        for hook in _after_async_commit_hooks:
+            await hook(self.info)
+
+
+def make_async_sessionmaker(bind):
+    # Objects stay usable after commit since expired attributes
+    # cannot be lazily reloaded outside an await
+    return async_sessionmaker(bind, class_=HookedAsyncSession, autoflush=False, expire_on_commit=False)
+
+
 # Database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20,
-    echo=settings.DEBUG,
-)
+engine = make_engine(settings.DATABASE_URL)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async database engine and session factory
+async_engine = make_async_engine(settings.DATABASE_URL)
+AsyncSessionLocal = make_async_sessionmaker(async_engine)
+
 # Base class for models
 Base = declarative_base()
 
 # Redis client
 redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+# Async Redis client (pub/sub, long-polling)
+async_redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -32,6 +103,15 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Dependency to get Redis client
 def get_redis():
-    return redis_client 
\ No newline at end of file
+    return redis_client
+
+# Dependency to get async Redis client
+def get_async_redis():
+    return async_redis_client
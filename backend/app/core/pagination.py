@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Tuple, Union
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """
+    Encode a (created_at, id) position as an opaque cursor
+    """
+    payload = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def paginate_keyset(query: Union[Query, Select], model, cursor: Optional[str], limit: int) -> Union[Query, Select]:
+    """
+    Order newest first on (created_at, id) and seek past the cursor.
+
+    One extra row is fetched so the caller can tell whether a next page exists.
+    """
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim the look-ahead row and build the cursor for the next page
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], summary: Iterable[str]) -> Optional[List[str]]:
+    """
+    Parse a `fields=` projection: "summary" or a comma-separated list of columns.
+
+    id and created_at are always included since they form the cursor.
+    """
+    if not fields:
+        return None
+
+    requested = list(summary) if fields == "summary" else [f.strip() for f in fields.split(",") if f.strip()]
+    invalid = [f for f in requested if f not in allowed]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown or unsupported fields: {', '.join(invalid)}"
+        )
+
+    return ["id", "created_at"] + [f for f in requested if f not in ("id", "created_at")]
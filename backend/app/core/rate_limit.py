@@ -0,0 +1,167 @@
+from typing import List, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+import structlog
+from app.core.config import settings
+from app.core.database import async_redis_client
+from app.core.security import decode_token
+from app.models.user import SubscriptionTier
+
+logger = structlog.get_logger()
+
+RATE_LIMIT_KEY = "ratelimit:{scope}:{identity}:{window}"
+
+RATE_LIMIT_HEADERS = ["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"]
+
+EXEMPT_PATHS = {"/health"}
+
+WINDOWS = (("minute", 60), ("hour", 3600))
+
+# GCRA over every key at once. KEYS are the limits to check; ARGV holds a
+# (limit, period_ms) pair per key. Each key stores its theoretical arrival time
+# (TAT) in milliseconds of Redis server time. The request is admitted only if
+# every limit admits it, in which case all TATs advance together.
+#
+# Returns {allowed, limit, remaining, reset_seconds, retry_after_seconds} for
+# the binding limit: the one with the fewest requests left.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local allowed = 1
+local tats = {}
+local binding_limit, binding_remaining, binding_reset = 0, -1, 0
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2 - 1])
+    local period = tonumber(ARGV[i * 2])
+    local interval = period / limit
+
+    local tat = math.max(tonumber(redis.call('GET', key)) or now, now)
+    local new_tat = tat + interval
+    local remaining, reset
+
+    if new_tat - now > period then
+        allowed = 0
+        retry_after = math.max(retry_after, new_tat - now - period)
+        remaining, reset = 0, tat - now
+    else
+        remaining, reset = math.floor((period - (new_tat - now)) / interval), new_tat - now
+    end
+
+    tats[i] = new_tat
+    if binding_remaining < 0 or remaining < binding_remaining
+        or (remaining == binding_remaining and reset > binding_reset) then
+        binding_limit, binding_remaining, binding_reset = limit, remaining, reset
+    end
+end
+
+if allowed == 1 then
+    for i, key in ipairs(KEYS) do
+        redis.call('SET', key, string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+    end
+end
+
+return {allowed, binding_limit, binding_remaining, math.ceil(binding_reset / 1000), math.ceil(retry_after / 1000)}
+"""
+
+Limit = Tuple[str, int, int]  # (key, requests, period seconds)
+
+
+def tier_limits(tier: SubscriptionTier) -> Tuple[int, int]:
+    """Per-minute and per-hour request limits for a subscription tier"""
+    multiplier = settings.RATE_LIMIT_TIER_MULTIPLIERS.get(tier.value, 1)
+    return settings.RATE_LIMIT_PER_MINUTE * multiplier, settings.RATE_LIMIT_PER_HOUR * multiplier
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing per-user and per-IP request limits in Redis.
+
+    Authenticated requests are limited by user at their tier's limits, read
+    from the access token's uid/tier claims so no database lookup is needed.
+    Every request is also limited by client IP. All limits are checked in one
+    atomic GCRA script, and responses carry RateLimit-* headers for the most
+    constrained limit. If Redis is unavailable requests are let through.
+    """
+
+    def __init__(self, app, redis=None):
+        self.app = app
+        self.redis = redis or async_redis_client
+        self.script = self.redis.register_script(GCRA_SCRIPT)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        limits = self._limits(scope)
+        try:
+            allowed, limit, remaining, reset, retry_after = await self.script(
+                keys=[key for key, _, _ in limits],
+                args=[value for _, requests, period in limits for value in (requests, period * 1000)]
+            )
+        except Exception as e:
+            logger.warning("Rate limiter unavailable", error=str(e))
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            "RateLimit-Limit": str(limit),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(reset),
+        }
+
+        if not allowed:
+            headers["Retry-After"] = str(max(retry_after, 1))
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers=headers
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def _limits(self, scope) -> List[Limit]:
+        limits = []
+
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        ip_limits = (settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_PER_HOUR)
+        for (window, period), requests in zip(WINDOWS, ip_limits):
+            limits.append((RATE_LIMIT_KEY.format(scope="ip", identity=client_ip, window=window), requests, period))
+
+        identity = self._identity(Headers(scope=scope))
+        if identity:
+            user, tier = identity
+            for (window, period), requests in zip(WINDOWS, tier_limits(tier)):
+                limits.append((RATE_LIMIT_KEY.format(scope="user", identity=user, window=window), requests, period))
+
+        return limits
+
+    @staticmethod
+    def _identity(headers: Headers) -> Optional[Tuple[str, SubscriptionTier]]:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        payload = decode_token(token)
+        if not payload:
+            return None
+
+        # Tokens issued before the uid/tier claims fall back to the subject and free tier
+        try:
+            tier = SubscriptionTier(payload.get("tier", SubscriptionTier.FREE.value))
+        except ValueError:
+            tier = SubscriptionTier.FREE
+        return str(payload.get("uid") or payload["sub"]), tier
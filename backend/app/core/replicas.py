@@ -0,0 +1,207 @@
+import itertools
+import time
+from typing import Iterable, List, Optional
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+import structlog
+from app.core.config import settings
+from app.core.database import (
+    ASYNC_SESSION,
+    AsyncSessionLocal,
+    SessionLocal,
+    after_async_commit,
+    async_redis_client,
+    make_async_engine,
+    make_async_sessionmaker,
+    make_engine,
+    redis_client,
+)
+from app.core.security import get_current_principal
+from app.models.user import User
+from app.schemas.auth import Principal
+
+logger = structlog.get_logger()
+
+RECENT_WRITE_KEY = "db:recent_write:{user_id}"
+
+# Seconds behind the primary; zero when every received WAL record is replayed
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    """
+    A read replica with its engines and last measured replication lag
+    """
+
+    def __init__(self, url: str):
+        self.host = make_url(url).host
+        self.engine = make_engine(url)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = make_async_engine(url)
+        self.async_session_factory = make_async_sessionmaker(self.async_engine)
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+
+    @property
+    def needs_check(self) -> bool:
+        return time.monotonic() - self.checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL
+
+    @property
+    def is_usable(self) -> bool:
+        return self.lag is not None and self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+    def _record_failure(self, error: Exception):
+        self.lag = None
+        logger.warning("Replica lag check failed", replica=self.host, error=str(error))
+
+
+class ReplicaRouter:
+    """
+    Routes read-only sessions to replicas.
+
+    Replicas are tried round-robin; one whose lag exceeds REPLICA_MAX_LAG_SECONDS
+    (or that cannot be reached) is skipped, and reads fall back to the primary
+    when none is usable. A user's reads stay on the primary for
+    READ_YOUR_WRITES_SECONDS after any of their writes is committed.
+    """
+
+    def __init__(self, urls: List[str] = None, redis=None, async_redis=None):
+        urls = settings.DATABASE_REPLICA_URLS if urls is None else urls
+        self.replicas = [Replica(url) for url in urls]
+        self.redis = redis or redis_client
+        self.async_redis = async_redis or async_redis_client
+        self._counter = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def _rotation(self) -> List[Replica]:
+        start = next(self._counter) % len(self.replicas)
+        return self.replicas[start:] + self.replicas[:start]
+
+    async def _check_async(self, replica: Replica):
+        replica.checked_at = time.monotonic()
+        try:
+            async with replica.async_engine.connect() as connection:
+                replica.lag = float((await connection.execute(LAG_QUERY)).scalar())
+        except Exception as e:
+            replica._record_failure(e)
+
+    def _check(self, replica: Replica):
+        replica.checked_at = time.monotonic()
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag = float(connection.execute(LAG_QUERY).scalar())
+        except Exception as e:
+            replica._record_failure(e)
+
+    async def pick_async(self) -> Optional[Replica]:
+        for replica in self._rotation():
+            if replica.needs_check:
+                await self._check_async(replica)
+            if replica.is_usable:
+                return replica
+        return None
+
+    def pick(self) -> Optional[Replica]:
+        for replica in self._rotation():
+            if replica.needs_check:
+                self._check(replica)
+            if replica.is_usable:
+                return replica
+        return None
+
+    async def read_session(self, user_id: Optional[int] = None):
+        """
+        Open an AsyncSession for read-only work, on a replica when allowed
+        """
+        if not self.enabled:
+            return AsyncSessionLocal()
+        if user_id is not None and await self.async_redis.exists(RECENT_WRITE_KEY.format(user_id=user_id)):
+            return AsyncSessionLocal()
+
+        replica = await self.pick_async()
+        return replica.async_session_factory() if replica else AsyncSessionLocal()
+
+    def read_session_sync(self) -> Session:
+        """
+        Open a Session for read-only background work, on a replica when one is usable
+        """
+        if not self.enabled:
+            return SessionLocal()
+        replica = self.pick()
+        return replica.session_factory() if replica else SessionLocal()
+
+    def mark_writes(self, user_ids: Iterable[int]):
+        """
+        Pin the users' reads to the primary for READ_YOUR_WRITES_SECONDS
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(RECENT_WRITE_KEY.format(user_id=user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+        pipe.execute()
+
+    async def mark_writes_async(self, user_ids: Iterable[int]):
+        async with self.async_redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.set(RECENT_WRITE_KEY.format(user_id=user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+            await pipe.execute()
+
+
+replica_router = ReplicaRouter()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_users(session, flush_context):
+    if not replica_router.enabled:
+        return
+    written = session.info.setdefault("written_user_ids", set())
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        user_id = instance.id if isinstance(instance, User) else getattr(instance, "user_id", None)
+        if user_id is not None:
+            written.add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_written_users(session):
+    if session.info.get(ASYNC_SESSION):
+        return  # Left for _mark_written_users_async
+    user_ids = session.info.pop("written_user_ids", None)
+    if not user_ids:
+        return
+    try:
+        replica_router.mark_writes(user_ids)
+    except Exception as e:
+        # Stale reads are preferable to failing an already committed request
+        logger.warning("Failed to record recent writes", user_ids=sorted(user_ids), error=str(e))
+
+
+@after_async_commit
+async def _mark_written_users_async(info):
+    user_ids = info.pop("written_user_ids", None)
+    if not user_ids:
+        return
+    try:
+        await replica_router.mark_writes_async(user_ids)
+    except Exception as e:
+        logger.warning("Failed to record recent writes", user_ids=sorted(user_ids), error=str(e))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_written_users(session, previous_transaction):
+    session.info.pop("written_user_ids", None)
+
+
+# Dependency to get a read-only async session for the current user
+async def get_async_read_db(current_user: Principal = Depends(get_current_principal)):
+    async with await replica_router.read_session(current_user.id) as db:
+        yield db
@@ -1,29 +1,122 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Union, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+import structlog
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import ASYNC_SESSION, after_async_commit, async_redis_client, get_async_db, redis_client
 from app.models.user import User
+from app.schemas.auth import Principal
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = structlog.get_logger()
+
+# Password hashing; hashes outside the configured cost are upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 # JWT token security
 security = HTTPBearer()
 
+# Cached principals, keyed by token subject (email)
+PRINCIPAL_KEY = "auth:principal:{subject}"
+
+# User columns a cached Principal is built from
+PRINCIPAL_FIELDS = ("email", "subscription_tier", "is_active")
+
+
+class LocalPrincipalCache:
+    """
+    Small in-process LRU of principals with a short TTL, in front of Redis.
+
+    Saves the Redis round trip for repeat requests with the same token.
+    Commits in this process evict entries directly; changes made elsewhere
+    are seen once the entry expires.
+    """
+
+    def __init__(self, ttl: float = None, max_size: int = None):
+        self.ttl = settings.PRINCIPAL_LOCAL_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.PRINCIPAL_LOCAL_CACHE_SIZE if max_size is None else max_size
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.monotonic():
+            del self._entries[subject]
+            return None
+        self._entries.move_to_end(subject)
+        return principal
+
+    def set(self, subject: str, principal: Principal):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[subject] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def evict(self, subjects):
+        for subject in subjects:
+            self._entries.pop(subject, None)
+
+
+local_principals = LocalPrincipalCache()
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool.
+
+    At most `workers` hashes run at once and `queue_size` more may wait;
+    beyond that callers get an immediate 503 instead of piling up behind
+    CPU-bound work.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None):
+        workers = workers or settings.PASSWORD_HASH_WORKERS
+        queue_size = settings.PASSWORD_HASH_QUEUE_SIZE if queue_size is None else queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    async def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self._slots.release()
 
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
 
-def get_password_hash(password: str) -> str:
-    """Generate password hash"""
-    return pwd_context.hash(password)
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash when the stored one uses outdated parameters"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+
+password_hasher = PasswordHasher()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -39,34 +132,95 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token and return user email"""
+def user_claims(user: User) -> dict:
+    """JWT claims for a user: subject plus id and tier for lookup-free consumers"""
+    return {"sub": user.email, "uid": user.id, "tier": user.subscription_tier.value}
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verify JWT token and return its claims"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token and return user email"""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
+
+async def resolve_principal(token: str, db: AsyncSession) -> Optional[Principal]:
+    """
+    Resolve a token to its Principal, from the caches when possible.
+
+    The in-process cache is checked first, then Redis. Only misses in both
+    query the database (by the uid claim, or by email for tokens issued
+    before it existed).
+    """
+    claims = decode_token(token)
+    if claims is None:
+        return None
+    
+    principal = local_principals.get(claims["sub"])
+    if principal is not None:
+        return principal
+    
+    key = PRINCIPAL_KEY.format(subject=claims["sub"])
+    cached = await async_redis_client.get(key)
+    if cached:
+        principal = Principal.model_validate_json(cached)
+        local_principals.set(claims["sub"], principal)
+        return principal
+    
+    if claims.get("uid") is not None:
+        user = await db.get(User, claims["uid"])
+        if user is not None and user.email != claims["sub"]:
+            user = None
+    else:
+        user = (await db.execute(select(User).where(User.email == claims["sub"]))).scalar_one_or_none()
+    if user is None:
+        return None
+    
+    principal = Principal.model_validate(user)
+    await async_redis_client.set(key, principal.model_dump_json(), ex=settings.PRINCIPAL_CACHE_TTL)
+    local_principals.set(claims["sub"], principal)
+    return principal
 
 
-def get_current_user(
+async def get_current_principal(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    token = credentials.credentials
-    email = verify_token(token)
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """Get the authenticated, active principal without loading the user row"""
+    principal = await resolve_principal(credentials.credentials, db)
     
-    if email is None:
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.email == email).first()
+    if not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    
+    return principal
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get current authenticated user"""
+    user = await db.get(User, principal.id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,12 +228,6 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
-        )
-    
     return user
 
 
@@ -90,4 +238,48 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
-    return current_user 
\ No newline at end of file
+    return current_user
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_stale_principals(session, flush_context):
+    stale = session.info.setdefault("stale_principal_subjects", set())
+    for instance in itertools.chain(session.dirty, session.deleted):
+        if not isinstance(instance, User):
+            continue
+        state = inspect(instance)
+        histories = [state.attrs[field].history for field in PRINCIPAL_FIELDS]
+        if instance in session.deleted or any(history.has_changes() for history in histories):
+            # Both the previous and the new email may have cached entries
+            stale.update(histories[0].sum() or [instance.email])
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stale_principals(session):
+    if session.info.get(ASYNC_SESSION):
+        return  # Left for _invalidate_stale_principals_async
+    subjects = session.info.pop("stale_principal_subjects", None)
+    if not subjects:
+        return
+    local_principals.evict(subjects)
+    try:
+        redis_client.delete(*[PRINCIPAL_KEY.format(subject=subject) for subject in subjects])
+    except Exception as e:
+        logger.warning("Failed to invalidate cached principals", error=str(e))
+
+
+@after_async_commit
+async def _invalidate_stale_principals_async(info):
+    subjects = info.pop("stale_principal_subjects", None)
+    if not subjects:
+        return
+    local_principals.evict(subjects)
+    try:
+        await async_redis_client.delete(*[PRINCIPAL_KEY.format(subject=subject) for subject in subjects])
+    except Exception as e:
+        logger.warning("Failed to invalidate cached principals", error=str(e))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_stale_principals(session, previous_transaction):
+    session.info.pop("stale_principal_subjects", None)
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Optional
+from fastapi import Depends
+from app.services.ai_service import AIService
+from app.services.optimization_service import OptimizationService
+from app.services.quality_service import QualityService
+from app.services.token_service import TokenService
+
+
+class ServiceContainer:
+    """
+    Process-wide services.
+
+    Built once per process, in the FastAPI lifespan or in Celery's
+    worker_process_init, so tokenizer encoders, provider HTTP clients, cost
+    tables and compiled rules are shared by every request and task instead of
+    being rebuilt each time. Workers also keep one event loop for the life of
+    the process, since async clients hold connections bound to their loop.
+    """
+
+    def __init__(self):
+        self.token_service = TokenService()
+        self.ai_service = AIService()
+        self.quality_service = QualityService(ai_service=self.ai_service)
+        self.optimization_service = OptimizationService(
+            token_service=self.token_service,
+            ai_service=self.ai_service,
+            quality_service=self.quality_service
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self, coroutine):
+        """Run a coroutine to completion on the process's event loop (sync callers only)"""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+
+    async def aclose(self):
+        await self.ai_service.aclose()
+
+
+_services: Optional[ServiceContainer] = None
+
+
+def init_services() -> ServiceContainer:
+    """Build the process's services; called after fork, never before"""
+    global _services
+    _services = ServiceContainer()
+    return _services
+
+
+def get_services() -> ServiceContainer:
+    """The process's services, built on first use outside the API and workers (scripts, eager tasks)"""
+    return _services or init_services()
+
+
+async def close_services():
+    global _services
+    if _services is not None:
+        await _services.aclose()
+        _services = None
+
+
+# Dependencies exposing individual services to endpoints
+def get_token_service(services: ServiceContainer = Depends(get_services)) -> TokenService:
+    return services.token_service
+
+
+def get_quality_service(services: ServiceContainer = Depends(get_services)) -> QualityService:
+    return services.quality_service
+
+
+def get_optimization_service(services: ServiceContainer = Depends(get_services)) -> OptimizationService:
+    return services.optimization_service
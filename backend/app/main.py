@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
@@ -6,10 +7,13 @@ import structlog
 import time
 
 from app.core.config import settings
-from app.core.database import engine
-from app.models import Base
 from app.api.v1.api import api_router
 from app.core.celery_app import celery_app
+from app.core.database import async_engine
+from app.core.replicas import replica_router
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.rate_limit import RATE_LIMIT_HEADERS, RateLimitMiddleware
+from app.core.services import close_services, init_services
 
 # Configure structured logging
 structlog.configure(
@@ -32,8 +36,17 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Database schema is managed by Alembic migrations (alembic upgrade head)
+
+# Build process-wide services on startup; close them and pooled async connections on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_services()
+    yield
+    await close_services()
+    await async_engine.dispose()
+    for replica in replica_router.replicas:
+        await replica.async_engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,15 +55,19 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs" if settings.ENVIRONMENT == "development" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
+    lifespan=lifespan,
 )
 
-# Add middleware
+# Add middleware (the last added runs first, so rate limiting sits inside CORS)
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_HOSTS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, *RATE_LIMIT_HEADERS],
 )
 
 app.add_middleware(
@@ -1,14 +1,19 @@
 from .user import User
+from .prompt_blob import PromptBlob
 from .prompt import Prompt, Optimization
 from .template import Template
-from .analytics import Analytics
+from .analytics import Analytics, AnalyticsRollup
 from .multimodal import MultimodalPrompt
+from .archive import OptimizationArchive
 
 __all__ = [
     "User",
     "Prompt", 
+    "PromptBlob",
     "Optimization",
     "Template",
     "Analytics",
-    "MultimodalPrompt"
+    "AnalyticsRollup",
+    "MultimodalPrompt",
+    "OptimizationArchive"
 ] 
\ No newline at end of file
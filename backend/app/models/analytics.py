@@ -1,11 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, JSON, Date
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, ForeignKey, JSON, Date, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
+# Legacy per-day table, no longer written: AnalyticsRollup is the single
+# source for analytics reads. Old rows are only pruned by cleanup_old_analytics_task.
 class Analytics(Base):
     __tablename__ = "analytics"
+    __table_args__ = (
+        # One row per user and day
+        UniqueConstraint("user_id", "date", name="uq_analytics_user_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -96,4 +103,45 @@ class Analytics(Base):
         if opt_type:
             if not self.optimization_type_usage:
                 self.optimization_type_usage = {}
-            self.optimization_type_usage[opt_type] = self.optimization_type_usage.get(opt_type, 0) + 1 
\ No newline at end of file
+            self.optimization_type_usage[opt_type] = self.optimization_type_usage.get(opt_type, 0) + 1 
+
+class AnalyticsRollup(Base):
+    """
+    Pre-aggregated optimization metrics for one scope and time bucket.
+
+    Rows are maintained incrementally as optimizations complete, at hour, day,
+    week and month granularity.
+    """
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", "granularity", "bucket_start", name="uq_analytics_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Scope ("user", "organization") and bucket
+    scope = Column(String(20), nullable=False, default="user")
+    scope_id = Column(Integer, nullable=False)
+    granularity = Column(String(10), nullable=False)  # hour, day, week, month
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    
+    # Additive metrics; averages are derived as sum / count
+    optimizations = Column(Integer, nullable=False, default=0)
+    tokens_processed = Column(BigInteger, nullable=False, default=0)
+    tokens_saved = Column(BigInteger, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
+    cost_savings = Column(Float, nullable=False, default=0.0)
+    token_reduction_percentage_sum = Column(Float, nullable=False, default=0.0)
+    quality_score_sum = Column(Float, nullable=False, default=0.0)
+    successful_optimizations = Column(Integer, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0.0)
+    processing_time_count = Column(Integer, nullable=False, default=0)
+    
+    # Breakdowns
+    model_usage = Column(JSONB)  # {"gpt-4": 10, ...}
+    optimization_type_usage = Column(JSONB)  # {"token_reduction": 8, ...}
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<AnalyticsRollup(scope='{self.scope}', scope_id={self.scope_id}, granularity='{self.granularity}', bucket_start='{self.bucket_start}')>"
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class OptimizationArchive(Base):
+    """
+    Manifest of optimizations partitions exported to columnar archive files
+    """
+    __tablename__ = "optimization_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    partition_name = Column(String(63), nullable=False, unique=True)
+    
+    # Covered created_at range [range_start, range_end)
+    range_start = Column(DateTime(timezone=True), nullable=False)
+    range_end = Column(DateTime(timezone=True), nullable=False)
+    
+    # Archive location (local path or object-store URI)
+    path = Column(String(1024), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<OptimizationArchive(partition='{self.partition_name}', rows={self.row_count})>"
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Enum, JSON, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, selectinload
 import enum
 from app.core.database import Base
+from app.models.prompt_blob import blob_text
 
 
 class OptimizationType(str, enum.Enum):
@@ -22,13 +23,15 @@ class PromptStatus(str, enum.Enum):
 
 class Prompt(Base):
     __tablename__ = "prompts"
+    # Fetch server-generated timestamps on flush; async sessions cannot lazy-refresh them
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
-    # Prompt content
-    original_prompt = Column(Text, nullable=False)
-    optimized_prompt = Column(Text)
+    # Prompt content (deduplicated in prompt_blobs, loaded on access)
+    original_prompt_hash = Column(String(64), ForeignKey("prompt_blobs.hash"), nullable=False)
+    optimized_prompt_hash = Column(String(64), ForeignKey("prompt_blobs.hash"))
     prompt_type = Column(String(50), default="text")  # text, code, image, audio
     
     # Metadata
@@ -46,6 +49,7 @@ class Prompt(Base):
     clarity_score = Column(Float)  # 1-10 scale
     specificity_score = Column(Float)  # 1-10 scale
     overall_quality_score = Column(Float)  # 1-10 scale
+    ai_quality_score = Column(Float)  # AI component of the overall score, if one was obtained
     
     # Status and timestamps
     status = Column(Enum(PromptStatus), default=PromptStatus.DRAFT)
@@ -55,6 +59,11 @@ class Prompt(Base):
     # Relationships
     user = relationship("User", back_populates="prompts")
     optimizations = relationship("Optimization", back_populates="prompt")
+    original_prompt_blob = relationship("PromptBlob", foreign_keys=[original_prompt_hash], viewonly=True)
+    optimized_prompt_blob = relationship("PromptBlob", foreign_keys=[optimized_prompt_hash], viewonly=True)
+    
+    original_prompt = blob_text("original_prompt")
+    optimized_prompt = blob_text("optimized_prompt")
     
     def __repr__(self):
         return f"<Prompt(id={self.id}, title='{self.title}', status='{self.status}')>"
@@ -73,8 +82,13 @@ class Prompt(Base):
 
 class Optimization(Base):
     __tablename__ = "optimizations"
+    __table_args__ = {
+        # Monthly partitions are managed by OptimizationArchiveService
+        "postgresql_partition_by": "RANGE (created_at)",
+    }
+    __mapper_args__ = {"eager_defaults": True}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
@@ -83,9 +97,9 @@ class Optimization(Base):
     model_used = Column(String(100))  # gpt-4, claude-3, etc.
     target_model = Column(String(100))  # For model adaptation
     
-    # Results
-    original_prompt = Column(Text, nullable=False)
-    optimized_prompt = Column(Text, nullable=False)
+    # Results (deduplicated in prompt_blobs, loaded on access)
+    original_prompt_hash = Column(String(64), ForeignKey("prompt_blobs.hash"), nullable=False)
+    optimized_prompt_hash = Column(String(64), ForeignKey("prompt_blobs.hash"), nullable=False)
     
     # Token analysis
     original_tokens = Column(Integer, nullable=False)
@@ -108,13 +122,19 @@ class Optimization(Base):
     optimization_notes = Column(Text)
     optimization_settings = Column(JSON)  # Settings used for optimization
     processing_time = Column(Float)  # Time taken in seconds
+    stage_timings = Column(JSON)  # Seconds per pipeline stage, e.g. {"rewrite": 2.1, "quality": 0.4}
     
-    # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Timestamps (partition key, hence part of the primary key)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     
     # Relationships
     prompt = relationship("Prompt", back_populates="optimizations")
     user = relationship("User", back_populates="optimizations")
+    original_prompt_blob = relationship("PromptBlob", foreign_keys=[original_prompt_hash], viewonly=True)
+    optimized_prompt_blob = relationship("PromptBlob", foreign_keys=[optimized_prompt_hash], viewonly=True)
+    
+    original_prompt = blob_text("original_prompt")
+    optimized_prompt = blob_text("optimized_prompt")
     
     def __repr__(self):
         return f"<Optimization(id={self.id}, type='{self.optimization_type}', reduction='{self.token_reduction_percentage}%')>"
@@ -127,4 +147,14 @@ class Optimization(Base):
         
         if self.original_cost and self.optimized_cost:
             self.cost_savings = self.original_cost - self.optimized_cost
-            self.cost_savings_percentage = (self.cost_savings / self.original_cost) * 100 
\ No newline at end of file
+            self.cost_savings_percentage = (self.cost_savings / self.original_cost) * 100 
+
+
+# Per-user listings and time-range scans (newest first, id as tie-breaker)
+Index("ix_prompts_user_created", Prompt.user_id, Prompt.created_at.desc(), Prompt.id.desc())
+Index("ix_optimizations_user_created", Optimization.user_id, Optimization.created_at.desc(), Optimization.id.desc())
+
+
+def load_prompt_text(model):
+    """Loader options fetching both prompt bodies of Prompt or Optimization rows up front"""
+    return [selectinload(model.original_prompt_blob), selectinload(model.optimized_prompt_blob)]
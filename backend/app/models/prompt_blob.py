@@ -0,0 +1,110 @@
+import hashlib
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, event
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import zstandard
+from app.core.config import settings
+from app.core.database import Base
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZSTD = "zstd"
+
+_compressor = zstandard.ZstdCompressor(level=settings.PROMPT_BLOB_COMPRESSION_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def encode_content(content: str):
+    """
+    Encode prompt text for storage, compressing it above the size threshold.
+
+    Returns (compression, size, data) where size is the uncompressed byte length.
+    """
+    raw = content.encode("utf-8")
+    if len(raw) >= settings.PROMPT_BLOB_COMPRESSION_THRESHOLD:
+        compressed = _compressor.compress(raw)
+        if len(compressed) < len(raw):
+            return COMPRESSION_ZSTD, len(raw), compressed
+    return COMPRESSION_NONE, len(raw), raw
+
+
+def decode_content(compression: str, data: bytes) -> str:
+    if compression == COMPRESSION_ZSTD:
+        data = _decompressor.decompress(data)
+    return bytes(data).decode("utf-8")
+
+
+class PromptBlob(Base):
+    """
+    Deduplicated prompt text, keyed by the SHA-256 of its UTF-8 encoding
+    """
+    __tablename__ = "prompt_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    compression = Column(String(10), nullable=False, default=COMPRESSION_NONE)
+    size = Column(Integer, nullable=False)  # Uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<PromptBlob(hash='{self.hash[:12]}', size={self.size}, compression='{self.compression}')>"
+
+    @classmethod
+    def from_content(cls, content: str) -> "PromptBlob":
+        compression, size, data = encode_content(content)
+        blob = cls(hash=content_hash(content), compression=compression, size=size, data=data)
+        blob._content = content
+        return blob
+
+    @property
+    def content(self) -> str:
+        content = getattr(self, "_content", None)
+        if content is None:
+            content = self._content = decode_content(self.compression, self.data)
+        return content
+
+
+def blob_text(name: str) -> property:
+    """
+    Text property backed by the `<name>_hash` column and `<name>_blob` relationship.
+
+    Reading loads the blob lazily. Assigning stores the hash and queues the blob;
+    queued blobs are inserted before the owning row at flush time, skipping
+    content that already exists.
+    """
+    hash_attribute = f"{name}_hash"
+    blob_attribute = f"{name}_blob"
+
+    def getter(self):
+        blob = getattr(self, blob_attribute)
+        return blob.content if blob is not None else None
+
+    def setter(self, value):
+        if value is None:
+            setattr(self, hash_attribute, None)
+            set_committed_value(self, blob_attribute, None)
+            return
+        blob = PromptBlob.from_content(value)
+        setattr(self, hash_attribute, blob.hash)
+        set_committed_value(self, blob_attribute, blob)
+        self.__dict__.setdefault("_pending_blobs", {})[blob.hash] = blob
+
+    return property(getter, setter)
+
+
+@event.listens_for(Session, "before_flush")
+def _insert_pending_blobs(session, flush_context, instances):
+    blobs = {}
+    for instance in list(session.new) + list(session.dirty):
+        blobs.update(instance.__dict__.pop("_pending_blobs", None) or {})
+
+    if blobs:
+        session.execute(pg_insert(PromptBlob).values([
+            {"hash": blob.hash, "compression": blob.compression, "size": blob.size, "data": blob.data}
+            for blob in blobs.values()
+        ]).on_conflict_do_nothing(index_elements=["hash"]))
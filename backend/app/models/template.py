@@ -5,6 +5,7 @@ from app.core.database import Base
 
 class Template(Base):
     __tablename__ = "templates"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     
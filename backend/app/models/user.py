@@ -14,6 +14,7 @@ class SubscriptionTier(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -55,24 +56,4 @@ class User(Base):
     @property
     def tokens_remaining(self):
         return max(0, self.monthly_tokens - self.tokens_used)
-    
-    def can_optimize(self, estimated_tokens: int = 0) -> bool:
-        """Check if user can perform optimization based on limits"""
-        if not self.is_active:
-            return False
-        
-        if self.subscription_tier == SubscriptionTier.ENTERPRISE:
-            return True
-        
-        if self.optimizations_used >= self.monthly_optimizations:
-            return False
-        
-        if self.tokens_used + estimated_tokens > self.monthly_tokens:
-            return False
-        
-        return True
-    
-    def record_optimization(self, tokens_used: int):
-        """Record optimization usage"""
-        self.optimizations_used += 1
-        self.tokens_used += tokens_used 
\ No newline at end of file
+ 
\ No newline at end of file
@@ -21,10 +21,11 @@ class AnalyticsBase(BaseModel):
 
 
 class AnalyticsResponse(AnalyticsBase):
-    id: int
+    id: Optional[int] = None  # None for rows served from rollups
     user_id: int
-    created_at: datetime
+    created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    is_live: bool = False
 
     class Config:
         from_attributes = True
@@ -34,6 +34,17 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+class Principal(BaseModel):
+    """Authenticated identity resolved from a token, cached between requests"""
+    id: int
+    email: str
+    subscription_tier: SubscriptionTier
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+
 # Import User schema to avoid circular imports
 from app.schemas.user import User
 Token.model_rebuild() 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 from app.models.prompt import PromptStatus, OptimizationType
 
@@ -44,6 +44,25 @@ class PromptResponse(PromptBase):
         from_attributes = True
 
 
+class PromptSummary(BaseModel):
+    """Lightweight prompt listing entry without prompt bodies"""
+    id: int
+    title: Optional[str] = None
+    category: Optional[str] = None
+    prompt_type: Optional[str] = None
+    tags: Optional[List[str]] = None
+    status: Optional[PromptStatus] = None
+    original_tokens: Optional[int] = None
+    optimized_tokens: Optional[int] = None
+    token_reduction_percentage: Optional[float] = None
+    overall_quality_score: Optional[float] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PromptList(BaseModel):
     prompts: List[PromptResponse]
     total: int
@@ -53,11 +72,13 @@ class PromptList(BaseModel):
 
 class OptimizationRequest(BaseModel):
     prompt_id: Optional[int] = None
-    original_prompt: str = Field(..., min_length=1, max_length=10000)
+    original_prompt: str = Field(..., min_length=1, max_length=100000)  # Long prompts are optimized in chunks
     optimization_type: OptimizationType = OptimizationType.TOKEN_REDUCTION
     target_model: Optional[str] = None
     reduction_target: Optional[float] = Field(None, ge=0.1, le=0.9)  # 10% to 90% reduction
-    quality_threshold: Optional[float] = Field(None, ge=1.0, le=10.0)  # 1-10 scale
+    quality_threshold: Optional[float] = Field(None, ge=1.0, le=10.0)  # 1-10 scale, mapped onto rule-based scores when used as a floor
+    candidates: int = Field(1, ge=1, le=8)  # Rewrites generated concurrently; the best one is kept
+    candidate_models: Optional[List[str]] = Field(None, min_length=1, max_length=4)  # Spread candidates over these instead of target_model
 
 
 class OptimizationResponse(BaseModel):
@@ -78,8 +99,29 @@ class OptimizationResponse(BaseModel):
     optimized_cost: Optional[float] = None
     cost_savings: Optional[float] = None
     cost_savings_percentage: Optional[float] = None
+    optimization_settings: Optional[Dict[str, Any]] = None
     processing_time: Optional[float] = None
+    stage_timings: Optional[Dict[str, float]] = None
     created_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+
+class OptimizationSummary(BaseModel):
+    """Lightweight optimization listing entry without prompt bodies"""
+    id: int
+    prompt_id: Optional[int] = None
+    optimization_type: Optional[OptimizationType] = None
+    model_used: Optional[str] = None
+    original_tokens: Optional[int] = None
+    optimized_tokens: Optional[int] = None
+    token_reduction: Optional[int] = None
+    token_reduction_percentage: Optional[float] = None
+    quality_score: Optional[float] = None
+    cost_savings: Optional[float] = None
+    processing_time: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,21 +1,39 @@
-import openai
+import asyncio
+import weakref
+from datetime import datetime
 import anthropic
 import google.generativeai as genai
+import structlog
 from typing import Dict, Any, Optional
+from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.database import async_redis_client
+
+logger = structlog.get_logger()
+
+# Prompt-cache usage of LLM calls, counted per provider and day
+PROMPT_CACHE_COUNTER_KEY = "ai:prompt_cache:{date}"
+PROMPT_CACHE_COUNTER_TTL = 30 * 24 * 3600
 
 
 class AIService:
-    def __init__(self):
-        # Initialize OpenAI client
+    def __init__(self, redis=None):
+        self.redis = redis or async_redis_client
+        
+        # Per event loop: provider -> concurrency slots
+        self._slots = weakref.WeakKeyDictionary()
+        
+        # Async clients keep their connection pools for the life of the service
+        self.openai_client: Optional[AsyncOpenAI] = None
         if settings.OPENAI_API_KEY:
-            openai.api_key = settings.OPENAI_API_KEY
+            self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         
-        # Initialize Anthropic client
+        self.anthropic_client: Optional[anthropic.AsyncAnthropic] = None
         if settings.ANTHROPIC_API_KEY:
-            self.anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+            self.anthropic_client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
         
-        # Initialize Google AI client
+        # Initialize Google AI client; models are built once per system prompt
+        self._gemini_models = {}
         if settings.GOOGLE_API_KEY:
             genai.configure(api_key=settings.GOOGLE_API_KEY)
     
@@ -25,92 +43,203 @@ class AIService:
         user_prompt: str, 
         model: str = "gpt-4",
         max_tokens: int = 2000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        instructions: Optional[str] = None
     ) -> str:
         """
-        Generate text using the specified AI model
+        Generate text using the specified AI model.
+
+        The system prompt is sent as a system message and should be fixed
+        text; per-call parameters belong in `instructions`, which follow it.
+        Any provider-side prefix caching is measured per call. At most
+        AI_PROVIDER_CONCURRENCY calls per provider run at once; the rest wait
+        for a slot.
         """
         try:
-            if model.startswith("gpt"):
-                return await self._generate_openai(system_prompt, user_prompt, model, max_tokens, temperature)
-            elif model.startswith("claude"):
-                return await self._generate_anthropic(system_prompt, user_prompt, model, max_tokens, temperature)
-            elif model.startswith("gemini"):
-                return await self._generate_google(system_prompt, user_prompt, model, max_tokens, temperature)
-            else:
-                # Default to OpenAI
-                return await self._generate_openai(system_prompt, user_prompt, "gpt-4", max_tokens, temperature)
+            async with self._slot(self.provider(model)):
+                if model.startswith("gpt"):
+                    return await self._generate_openai(system_prompt, user_prompt, model, max_tokens, temperature, instructions)
+                elif model.startswith("claude"):
+                    return await self._generate_anthropic(system_prompt, user_prompt, model, max_tokens, temperature, instructions)
+                elif model.startswith("gemini"):
+                    return await self._generate_google(system_prompt, user_prompt, model, max_tokens, temperature, instructions)
+                else:
+                    # Default to OpenAI
+                    return await self._generate_openai(system_prompt, user_prompt, "gpt-4", max_tokens, temperature, instructions)
         
         except Exception as e:
             raise Exception(f"AI generation failed: {str(e)}")
     
-    async def _generate_openai(self, system_prompt: str, user_prompt: str, model: str, max_tokens: int, temperature: float) -> str:
-        """Generate text using OpenAI"""
+    @staticmethod
+    def provider(model: str) -> str:
+        """Provider serving a model; unknown models go to OpenAI"""
+        if model.startswith("claude"):
+            return "anthropic"
+        elif model.startswith("gemini"):
+            return "google"
+        return "openai"
+    
+    def _slot(self, provider: str) -> asyncio.Semaphore:
+        slots = self._slots.setdefault(asyncio.get_running_loop(), {})
+        if provider not in slots:
+            slots[provider] = asyncio.Semaphore(settings.AI_PROVIDER_CONCURRENCY.get(provider, 4))
+        return slots[provider]
+    
+    async def _generate_openai(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        instructions: Optional[str] = None
+    ) -> str:
+        """Generate text using OpenAI (prefixes are cached automatically)"""
         if not settings.OPENAI_API_KEY:
             raise Exception("OpenAI API key not configured")
         
         try:
-            response = await openai.ChatCompletion.acreate(
+            messages = [{"role": "system", "content": system_prompt}]
+            if instructions:
+                messages.append({"role": "system", "content": instructions})
+            messages.append({"role": "user", "content": user_prompt})
+            
+            response = await self.openai_client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature
             )
             
+            usage = response.usage
+            details = getattr(usage, "prompt_tokens_details", None)
+            await self._record_cache_usage("openai", model, usage.prompt_tokens, getattr(details, "cached_tokens", 0) or 0)
+            
             return response.choices[0].message.content.strip()
         
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
     
-    async def _generate_anthropic(self, system_prompt: str, user_prompt: str, model: str, max_tokens: int, temperature: float) -> str:
+    async def _generate_anthropic(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        instructions: Optional[str] = None
+    ) -> str:
         """Generate text using Anthropic Claude"""
         if not settings.ANTHROPIC_API_KEY:
             raise Exception("Anthropic API key not configured")
         
         try:
-            # Combine system and user prompts for Claude
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
+            # No cache_control breakpoint: the fixed prompts are far below the
+            # minimum cacheable length, and padding them would cost more than it saves
+            system = [{"type": "text", "text": system_prompt}]
+            if instructions:
+                system.append({"type": "text", "text": instructions})
             
             response = await self.anthropic_client.messages.create(
                 model=model,
                 max_tokens=max_tokens,
                 temperature=temperature,
+                system=system,
                 messages=[
-                    {"role": "user", "content": full_prompt}
+                    {"role": "user", "content": user_prompt}
                 ]
             )
             
+            # input_tokens excludes tokens read from or written to the cache
+            usage = response.usage
+            cached_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+            input_tokens = usage.input_tokens + cached_tokens + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+            await self._record_cache_usage("anthropic", model, input_tokens, cached_tokens)
+            
             return response.content[0].text.strip()
         
         except Exception as e:
             raise Exception(f"Anthropic API error: {str(e)}")
     
-    async def _generate_google(self, system_prompt: str, user_prompt: str, model: str, max_tokens: int, temperature: float) -> str:
-        """Generate text using Google Gemini"""
+    async def _generate_google(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        instructions: Optional[str] = None
+    ) -> str:
+        """Generate text using Google Gemini (repeated system instructions are cached implicitly)"""
         if not settings.GOOGLE_API_KEY:
             raise Exception("Google API key not configured")
         
         try:
-            # Combine system and user prompts for Gemini
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
-            
-            model_instance = genai.GenerativeModel(model)
-            response = await model_instance.generate_content_async(
-                full_prompt,
+            response = await self._gemini_model(model, system_prompt).generate_content_async(
+                [instructions, user_prompt] if instructions else user_prompt,
                 generation_config=genai.types.GenerationConfig(
                     max_output_tokens=max_tokens,
                     temperature=temperature
                 )
             )
             
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                await self._record_cache_usage(
+                    "google",
+                    model,
+                    usage.prompt_token_count,
+                    getattr(usage, "cached_content_token_count", 0) or 0
+                )
+            
             return response.text.strip()
         
         except Exception as e:
             raise Exception(f"Google AI API error: {str(e)}")
     
+    def _gemini_model(self, model: str, system_prompt: str):
+        key = (model, system_prompt)
+        if key not in self._gemini_models:
+            self._gemini_models[key] = genai.GenerativeModel(model, system_instruction=system_prompt)
+        return self._gemini_models[key]
+    
+    async def _record_cache_usage(self, provider: str, model: str, input_tokens: int, cached_tokens: int):
+        """
+        Count prompt-cache hits, cached input tokens and estimated savings per provider and day
+        """
+        pricing = settings.MODEL_PRICING.get(model) or settings.MODEL_PRICING["gpt-4"]
+        discount = 1 - settings.PROMPT_CACHE_READ_PRICE_RATIOS.get(provider, 1.0)
+        savings = (cached_tokens / 1000) * pricing.get("input", 0.03) * discount
+        logger.debug(
+            "LLM call prompt cache usage",
+            provider=provider,
+            model=model,
+            input_tokens=input_tokens,
+            cached_tokens=cached_tokens,
+            savings=savings
+        )
+        
+        key = PROMPT_CACHE_COUNTER_KEY.format(date=datetime.utcnow().date().isoformat())
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(key, f"{provider}:calls", 1)
+                pipe.hincrby(key, f"{provider}:hits", int(cached_tokens > 0))
+                pipe.hincrby(key, f"{provider}:input_tokens", input_tokens)
+                pipe.hincrby(key, f"{provider}:cached_tokens", cached_tokens)
+                pipe.hincrbyfloat(key, f"{provider}:savings", savings)
+                pipe.expire(key, PROMPT_CACHE_COUNTER_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to count prompt cache usage", provider=provider, error=str(e))
+    
+    async def aclose(self):
+        """
+        Close the provider HTTP clients
+        """
+        for client in (self.openai_client, self.anthropic_client):
+            if client is not None:
+                await client.close()
+    
     async def analyze_text(self, text: str, analysis_type: str, model: str = "gpt-4") -> Dict[str, Any]:
         """
         Analyze text for various purposes (quality, sentiment, etc.)
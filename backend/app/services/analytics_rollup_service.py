@@ -0,0 +1,371 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, or_, select, cast, literal, Integer, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert, JSONB
+from app.models.analytics import AnalyticsRollup
+from app.models.prompt import Optimization
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+SUCCESS_QUALITY_THRESHOLD = 7.0
+
+# Advisory lock serializing rebuilds against incremental updates: workers take
+# it shared for their upsert transaction, rebuilds take it exclusively
+ROLLUP_LOCK_KEY = 0x726F6C6C  # "roll"
+
+ADDITIVE_COLUMNS = (
+    "optimizations",
+    "tokens_processed",
+    "tokens_saved",
+    "cost",
+    "cost_savings",
+    "token_reduction_percentage_sum",
+    "quality_score_sum",
+    "successful_optimizations",
+    "processing_time_sum",
+    "processing_time_count",
+)
+
+Segment = Tuple[str, datetime, datetime]
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """
+    Floor a timestamp to the start of its bucket (weeks start on Monday, like date_trunc)
+    """
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def next_month(timestamp: datetime) -> datetime:
+    month_start = bucket_start(timestamp, "month")
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def plan_segments(start: datetime, end: datetime) -> List[Segment]:
+    """
+    Split [start, end) into the coarsest rollup buckets that cover it.
+
+    The leading partial day is read from hourly rows, then whole days up to the
+    next month boundary, then whole months. Ranges are expected to end at "now",
+    so the last (still open) day or month bucket is read as a whole. Weeks do
+    not align with months and are only used for weekly reports.
+    """
+    segments: List[Segment] = []
+    cursor = bucket_start(start, "hour")
+    if cursor >= end:
+        return segments
+
+    day_boundary = bucket_start(cursor, "day")
+    if day_boundary < cursor:
+        day_boundary += timedelta(days=1)
+        segments.append(("hour", cursor, min(day_boundary, end)))
+        cursor = day_boundary
+        if cursor >= end:
+            return segments
+
+    month_boundary = cursor if bucket_start(cursor, "month") == cursor else next_month(cursor)
+    if month_boundary >= end:
+        segments.append(("day", cursor, end))
+        return segments
+
+    if cursor < month_boundary:
+        segments.append(("day", cursor, month_boundary))
+    segments.append(("month", month_boundary, end))
+    return segments
+
+
+def _increment_count(column, key: str):
+    """
+    jsonb expression adding one to column[key]
+    """
+    key = cast(literal(key), String)
+    current = func.coalesce(cast(column.op("->>")(key), Integer), 0)
+    return func.coalesce(column, cast(literal("{}"), JSONB)).op("||")(
+        func.jsonb_build_object(key, current + 1)
+    )
+
+
+class AnalyticsRollupService:
+    """
+    Maintains and queries hour/day/week/month analytics rollups
+    """
+
+    def record_optimization(
+        self,
+        db: Session,
+        scope_id: int,
+        optimization: Dict[str, Any],
+        created_at: Optional[datetime] = None,
+        scope: str = "user"
+    ):
+        """
+        Add one completed optimization to every granularity's bucket in a single upsert.
+
+        Holds the rollup lock shared until the caller's transaction ends, so
+        the upsert never interleaves with a rebuild.
+        """
+        created_at = created_at or datetime.utcnow()
+        if created_at.tzinfo is not None:
+            # Buckets are UTC, like date_trunc in rebuild
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        quality_score = optimization.get('quality_score') or 0
+        processing_time = optimization.get('processing_time') or 0
+        model_used = optimization.get('model_used')
+        optimization_type = optimization.get('optimization_type')
+        optimization_type = getattr(optimization_type, 'value', optimization_type)
+
+        increments = {
+            "optimizations": 1,
+            "tokens_processed": int(optimization.get('original_tokens') or 0),
+            "tokens_saved": int(optimization.get('token_reduction') or 0),
+            "cost": optimization.get('original_cost') or 0.0,
+            "cost_savings": optimization.get('cost_savings') or 0.0,
+            "token_reduction_percentage_sum": optimization.get('token_reduction_percentage') or 0.0,
+            "quality_score_sum": quality_score,
+            "successful_optimizations": 1 if quality_score >= SUCCESS_QUALITY_THRESHOLD else 0,
+            "processing_time_sum": processing_time,
+            "processing_time_count": 1 if processing_time else 0,
+        }
+
+        rows = [
+            {
+                "scope": scope,
+                "scope_id": scope_id,
+                "granularity": granularity,
+                "bucket_start": bucket_start(created_at, granularity),
+                "model_usage": {model_used: 1} if model_used else {},
+                "optimization_type_usage": {optimization_type: 1} if optimization_type else {},
+                **increments
+            }
+            for granularity in GRANULARITIES
+        ]
+
+        stmt = pg_insert(AnalyticsRollup).values(rows)
+        table = AnalyticsRollup.__table__
+        update_columns = {column: table.c[column] + stmt.excluded[column] for column in ADDITIVE_COLUMNS}
+        if model_used:
+            update_columns["model_usage"] = _increment_count(table.c.model_usage, model_used)
+        if optimization_type:
+            update_columns["optimization_type_usage"] = _increment_count(table.c.optimization_type_usage, optimization_type)
+        update_columns["updated_at"] = func.now()
+
+        db.execute(select(func.pg_advisory_xact_lock_shared(ROLLUP_LOCK_KEY)))
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.scope_id, table.c.granularity, table.c.bucket_start],
+            set_=update_columns
+        ))
+
+    def rebuild(self, db: Session, since: datetime, user_id: Optional[int] = None) -> int:
+        """
+        Recompute user rollups from the optimizations table for every bucket starting at or after `since`.
+
+        Takes the rollup lock exclusively until the caller commits, so worker
+        upserts wait for the rebuilt rows instead of racing the delete and insert.
+        """
+        db.execute(select(func.pg_advisory_xact_lock(ROLLUP_LOCK_KEY)))
+        rows_written = 0
+
+        for granularity in GRANULARITIES:
+            start = bucket_start(since, granularity)
+
+            delete_query = db.query(AnalyticsRollup).filter(
+                AnalyticsRollup.scope == "user",
+                AnalyticsRollup.granularity == granularity,
+                AnalyticsRollup.bucket_start >= start
+            )
+            if user_id is not None:
+                delete_query = delete_query.filter(AnalyticsRollup.scope_id == user_id)
+            delete_query.delete(synchronize_session=False)
+
+            result = db.execute(self._build_rebuild(granularity, start, user_id))
+            rows_written += result.rowcount
+
+        return rows_written
+
+    @staticmethod
+    def _build_rebuild(granularity: str, start: datetime, user_id: Optional[int]):
+        bucket = func.date_trunc(granularity, Optimization.created_at)
+        source_filter = [Optimization.created_at >= start]
+        if user_id is not None:
+            source_filter.append(Optimization.user_id == user_id)
+
+        def breakdown(key_column):
+            counts = select(
+                Optimization.user_id,
+                bucket.label("bucket"),
+                key_column.label("key"),
+                func.count().label("count")
+            ).where(*source_filter, key_column.isnot(None)).group_by(
+                Optimization.user_id, bucket, key_column
+            ).subquery()
+            return select(
+                counts.c.user_id,
+                counts.c.bucket,
+                func.jsonb_object_agg(counts.c.key, counts.c.count).label("usage")
+            ).group_by(counts.c.user_id, counts.c.bucket).subquery()
+
+        model_usage = breakdown(Optimization.model_used)
+        type_usage = breakdown(func.lower(cast(Optimization.optimization_type, String)))
+
+        processing_time = func.nullif(Optimization.processing_time, 0)
+        totals = select(
+            Optimization.user_id,
+            bucket.label("bucket"),
+            func.count().label("optimizations"),
+            func.coalesce(func.sum(Optimization.original_tokens), 0).label("tokens_processed"),
+            func.coalesce(func.sum(Optimization.token_reduction), 0).label("tokens_saved"),
+            func.coalesce(func.sum(Optimization.original_cost), 0.0).label("cost"),
+            func.coalesce(func.sum(Optimization.cost_savings), 0.0).label("cost_savings"),
+            func.coalesce(func.sum(Optimization.token_reduction_percentage), 0.0).label("token_reduction_percentage_sum"),
+            func.coalesce(func.sum(Optimization.quality_score), 0.0).label("quality_score_sum"),
+            func.count().filter(Optimization.quality_score >= SUCCESS_QUALITY_THRESHOLD).label("successful_optimizations"),
+            func.coalesce(func.sum(processing_time), 0.0).label("processing_time_sum"),
+            func.count(processing_time).label("processing_time_count")
+        ).where(*source_filter).group_by(Optimization.user_id, bucket).subquery()
+
+        rows = select(
+            literal("user", String).label("scope"),
+            totals.c.user_id,
+            literal(granularity, String).label("granularity"),
+            totals.c.bucket,
+            *[totals.c[column] for column in ADDITIVE_COLUMNS],
+            model_usage.c.usage,
+            type_usage.c.usage
+        ).select_from(totals).outerjoin(
+            model_usage,
+            and_(model_usage.c.user_id == totals.c.user_id, model_usage.c.bucket == totals.c.bucket)
+        ).outerjoin(
+            type_usage,
+            and_(type_usage.c.user_id == totals.c.user_id, type_usage.c.bucket == totals.c.bucket)
+        )
+
+        stmt = pg_insert(AnalyticsRollup).from_select(
+            ["scope", "scope_id", "granularity", "bucket_start", *ADDITIVE_COLUMNS, "model_usage", "optimization_type_usage"],
+            rows
+        )
+        table = AnalyticsRollup.__table__
+        # Rebuilt rows replace whatever is there
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.scope_id, table.c.granularity, table.c.bucket_start],
+            set_={
+                **{column: stmt.excluded[column] for column in (*ADDITIVE_COLUMNS, "model_usage", "optimization_type_usage")},
+                "updated_at": func.now()
+            }
+        )
+
+    async def get_buckets(
+        self,
+        db: AsyncSession,
+        scope_id: int,
+        granularity: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        scope: str = "user"
+    ) -> List[AnalyticsRollup]:
+        """
+        Get rollup rows of one granularity with bucket_start in [start, end), oldest first
+        """
+        query = select(AnalyticsRollup).where(
+            AnalyticsRollup.scope == scope,
+            AnalyticsRollup.scope_id == scope_id,
+            AnalyticsRollup.granularity == granularity
+        )
+        if start:
+            query = query.where(AnalyticsRollup.bucket_start >= start)
+        if end:
+            query = query.where(AnalyticsRollup.bucket_start < end)
+        result = await db.execute(query.order_by(AnalyticsRollup.bucket_start))
+        return result.scalars().all()
+
+    async def get_totals(
+        self,
+        db: AsyncSession,
+        scope_id: int,
+        start: datetime,
+        end: Optional[datetime] = None,
+        scope: str = "user"
+    ) -> Dict[str, Any]:
+        """
+        Aggregate metrics for [start, end) from the coarsest covering rollups
+        """
+        end = end or datetime.utcnow()
+        segments = plan_segments(start, end)
+        if not segments:
+            return self.combine([])
+
+        result = await db.execute(select(AnalyticsRollup).where(
+            AnalyticsRollup.scope == scope,
+            AnalyticsRollup.scope_id == scope_id,
+            or_(*[
+                and_(
+                    AnalyticsRollup.granularity == granularity,
+                    AnalyticsRollup.bucket_start >= segment_start,
+                    AnalyticsRollup.bucket_start < segment_end
+                )
+                for granularity, segment_start, segment_end in segments
+            ])
+        ))
+
+        return self.combine(result.scalars().all())
+
+    @staticmethod
+    def combine(rows: List[AnalyticsRollup]) -> Dict[str, Any]:
+        """
+        Sum additive columns and merge breakdowns across rollup rows
+        """
+        totals: Dict[str, Any] = {column: 0 for column in ADDITIVE_COLUMNS}
+        model_usage: Dict[str, int] = {}
+        optimization_type_usage: Dict[str, int] = {}
+
+        for row in rows:
+            for column in ADDITIVE_COLUMNS:
+                totals[column] += getattr(row, column) or 0
+            for key, count in (row.model_usage or {}).items():
+                model_usage[key] = model_usage.get(key, 0) + count
+            for key, count in (row.optimization_type_usage or {}).items():
+                optimization_type_usage[key] = optimization_type_usage.get(key, 0) + count
+
+        totals["model_usage"] = model_usage
+        totals["optimization_type_usage"] = optimization_type_usage
+        return totals
+
+    @staticmethod
+    def to_daily(row: AnalyticsRollup) -> Dict[str, Any]:
+        """
+        Convert a day rollup row into daily analytics values
+        """
+        optimizations = row.optimizations or 0
+        tokens_processed = row.tokens_processed or 0
+        tokens_saved = row.tokens_saved or 0
+        processing_time_count = row.processing_time_count or 0
+        successful = row.successful_optimizations or 0
+
+        return {
+            "date": row.bucket_start.date(),
+            "total_optimizations": optimizations,
+            "total_tokens_processed": tokens_processed,
+            "total_tokens_saved": tokens_saved,
+            "total_cost": row.cost or 0.0,
+            "total_cost_savings": row.cost_savings or 0.0,
+            "average_optimization_time": (
+                (row.processing_time_sum or 0.0) / processing_time_count if processing_time_count else 0.0
+            ),
+            "average_token_reduction": (tokens_saved / tokens_processed * 100) if tokens_processed > 0 else 0.0,
+            "average_quality_score": (row.quality_score_sum or 0.0) / optimizations if optimizations else 0.0,
+            "model_usage": row.model_usage or {},
+            "optimization_type_usage": row.optimization_type_usage or {},
+            "successful_optimizations": successful,
+            "failed_optimizations": optimizations - successful,
+            "user_satisfaction_score": 0.0,
+        }
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, cast, text, String
+from app.core.config import settings
+from app.models.archive import OptimizationArchive
+from app.models.prompt import Optimization
+from app.models.prompt_blob import PromptBlob
+
+PARTITION_NAME = "optimizations_y{year:04d}m{month:02d}"
+PARTITION_PATTERN = re.compile(r"^optimizations_y(\d{4})m(\d{2})$")
+
+EXPORT_BATCH_SIZE = 10000
+
+BLOB_FIELDS = ("original_prompt", "optimized_prompt")
+
+JSON_FIELDS = ("optimization_settings", "stage_timings")
+
+# Archived columns; optimization_type is stored as its lowercase value and
+# optimization_settings and stage_timings as JSON strings
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("prompt_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("optimization_type", pa.string()),
+    ("model_used", pa.string()),
+    ("target_model", pa.string()),
+    ("original_prompt", pa.large_string()),
+    ("optimized_prompt", pa.large_string()),
+    ("original_tokens", pa.int64()),
+    ("optimized_tokens", pa.int64()),
+    ("token_reduction", pa.int64()),
+    ("token_reduction_percentage", pa.float64()),
+    ("quality_score", pa.float64()),
+    ("clarity_score", pa.float64()),
+    ("specificity_score", pa.float64()),
+    ("original_cost", pa.float64()),
+    ("optimized_cost", pa.float64()),
+    ("cost_savings", pa.float64()),
+    ("cost_savings_percentage", pa.float64()),
+    ("optimization_notes", pa.large_string()),
+    ("optimization_settings", pa.large_string()),
+    ("processing_time", pa.float64()),
+    ("stage_timings", pa.large_string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+
+Month = Tuple[int, int]
+
+
+def add_months(month: Month, count: int) -> Month:
+    index = month[0] * 12 + month[1] - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def month_start(month: Month) -> datetime:
+    return datetime(month[0], month[1], 1, tzinfo=timezone.utc)
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
+
+
+class OptimizationArchiveService:
+    """
+    Manages monthly optimizations partitions and archives cold ones to Parquet
+    """
+
+    def __init__(self, archive_path: str = None):
+        self.archive_path = (archive_path or settings.OPTIMIZATION_ARCHIVE_PATH).rstrip("/")
+
+    def list_partitions(self, db: Session) -> List[Tuple[str, Month]]:
+        """
+        List monthly partitions of optimizations, oldest first (the default partition is skipped)
+        """
+        names = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'optimizations'::regclass"
+        )).scalars()
+
+        partitions = []
+        for name in names:
+            match = PARTITION_PATTERN.match(name)
+            if match:
+                partitions.append((name, (int(match.group(1)), int(match.group(2)))))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    def ensure_partitions(self, db: Session, months_ahead: int = None) -> List[str]:
+        """
+        Create partitions for the current month and the next `months_ahead` months.
+
+        Creating ahead of time keeps new rows out of the default partition, which
+        would otherwise block creating the matching monthly partition.
+        """
+        months_ahead = settings.OPTIMIZATION_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+        now = datetime.utcnow()
+        current = (now.year, now.month)
+        existing = {name for name, _ in self.list_partitions(db)}
+
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = PARTITION_NAME.format(year=month[0], month=month[1])
+            if name in existing:
+                continue
+            db.execute(text(
+                f'CREATE TABLE "{name}" PARTITION OF optimizations '
+                f"FOR VALUES FROM ('{month_start(month).isoformat()}') "
+                f"TO ('{month_start(add_months(month, 1)).isoformat()}')"
+            ))
+            created.append(name)
+
+        db.commit()
+        return created
+
+    def archive_cold_partitions(self, db: Session, hot_months: int = None) -> List[Dict[str, Any]]:
+        """
+        Archive and drop every monthly partition older than the last `hot_months` months
+        """
+        hot_months = settings.OPTIMIZATION_HOT_MONTHS if hot_months is None else hot_months
+        now = datetime.utcnow()
+        cutoff = add_months((now.year, now.month), -hot_months)
+
+        archived = []
+        for name, month in self.list_partitions(db):
+            if month >= cutoff:
+                break
+            archived.append(self.archive_partition(db, name, month))
+        return archived
+
+    def archive_partition(self, db: Session, name: str, month: Month) -> Dict[str, Any]:
+        """
+        Export one partition to Parquet, record it in the manifest, then detach and drop it.
+
+        The partition is locked against writes for the whole transaction, and is
+        only dropped once both the file and the partition hold the exported row
+        count. The manifest row, detach and drop share one transaction.
+        """
+        range_start = month_start(month)
+        range_end = month_start(add_months(month, 1))
+        path = f"{self.archive_path}/optimizations/year={month[0]:04d}/month={month[1]:02d}/{name}.parquet"
+
+        db.execute(text(f'LOCK TABLE "{name}" IN SHARE MODE'))
+        row_count = self._export(db, range_start, range_end, path)
+
+        partition_rows = db.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+        filesystem, file_path = pafs.FileSystem.from_uri(path)
+        with filesystem.open_input_file(file_path) as archive:
+            file_rows = pq.ParquetFile(archive).metadata.num_rows
+        if not row_count == partition_rows == file_rows:
+            db.rollback()
+            raise ValueError(
+                f"Archive of {name} is incomplete: exported {row_count} rows, "
+                f"file has {file_rows}, partition has {partition_rows}; partition kept"
+            )
+
+        db.add(OptimizationArchive(
+            partition_name=name,
+            range_start=range_start,
+            range_end=range_end,
+            path=path,
+            row_count=row_count
+        ))
+        db.execute(text(f'ALTER TABLE optimizations DETACH PARTITION "{name}"'))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+
+        return {"partition": name, "path": path, "row_count": row_count}
+
+    def _export(self, db: Session, range_start: datetime, range_end: datetime, path: str) -> int:
+        """
+        Stream rows in [range_start, range_end) into a zstd-compressed Parquet file
+        """
+        columns = []
+        for field in ARCHIVE_SCHEMA:
+            if field.name == "optimization_type":
+                columns.append(cast(Optimization.optimization_type, String).label(field.name))
+            elif field.name in BLOB_FIELDS:
+                columns.append(getattr(Optimization, f"{field.name}_hash").label(field.name))
+            else:
+                columns.append(getattr(Optimization, field.name))
+        stmt = select(*columns).where(
+            Optimization.created_at >= range_start,
+            Optimization.created_at < range_end
+        ).order_by(Optimization.user_id, Optimization.created_at).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        filesystem, file_path = pafs.FileSystem.from_uri(path)
+        filesystem.create_dir(file_path.rsplit("/", 1)[0], recursive=True)
+
+        row_count = 0
+        with pq.ParquetWriter(file_path, ARCHIVE_SCHEMA, filesystem=filesystem, compression="zstd") as writer:
+            for rows in db.execute(stmt).partitions():
+                # Prompt bodies are inlined so archives stay self-contained
+                hashes = {row._mapping[field] for row in rows for field in BLOB_FIELDS}
+                contents = {
+                    blob.hash: blob.content
+                    for blob in db.query(PromptBlob).filter(PromptBlob.hash.in_(hashes))
+                }
+
+                records = []
+                for row in rows:
+                    record = dict(row._mapping)
+                    for field in BLOB_FIELDS:
+                        record[field] = contents.get(record[field])
+                    record["optimization_type"] = (record["optimization_type"] or "").lower() or None
+                    for field in JSON_FIELDS:
+                        if record[field] is not None:
+                            record[field] = json.dumps(record[field])
+                    records.append(record)
+                writer.write_table(pa.Table.from_pylist(records, schema=ARCHIVE_SCHEMA))
+                row_count += len(records)
+
+        return row_count
+
+    async def query(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a user's archived optimizations in [start, end), newest first
+        """
+        manifest = select(OptimizationArchive.path)
+        if start:
+            manifest = manifest.where(OptimizationArchive.range_end > start)
+        if end:
+            manifest = manifest.where(OptimizationArchive.range_start < end)
+        paths = (await db.execute(manifest.order_by(OptimizationArchive.range_start.desc()))).scalars().all()
+        if not paths:
+            return []
+
+        # Parquet scans are blocking I/O
+        return await asyncio.to_thread(self.read, paths, user_id, start, end, columns, limit)
+
+    @staticmethod
+    def read(
+        paths: List[str],
+        user_id: int,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        columns: Optional[List[str]],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Scan archive files for one user's rows in [start, end), newest first
+        """
+        filesystem, _ = pafs.FileSystem.from_uri(paths[0])
+        dataset = ds.dataset(
+            [pafs.FileSystem.from_uri(path)[1] for path in paths],
+            schema=ARCHIVE_SCHEMA,
+            format="parquet",
+            filesystem=filesystem
+        )
+
+        timestamp_type = ARCHIVE_SCHEMA.field("created_at").type
+        condition = ds.field("user_id") == user_id
+        if start:
+            condition = condition & (ds.field("created_at") >= pa.scalar(_as_utc(start), type=timestamp_type))
+        if end:
+            condition = condition & (ds.field("created_at") < pa.scalar(_as_utc(end), type=timestamp_type))
+
+        table = dataset.to_table(columns=columns, filter=condition)
+        table = table.sort_by([("created_at", "descending"), ("id", "descending")]).slice(0, limit)
+        return table.to_pylist()
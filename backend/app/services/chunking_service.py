@@ -0,0 +1,99 @@
+import re
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.services.token_service import TokenService
+
+# Markdown headings and short label lines such as "Rules:" open a new section
+_HEADING = re.compile(r"^(?:#{1,6}[ \t]|[^\n]{1,60}:[ \t]*$)")
+_FENCE = re.compile(r"^[ \t]*```")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])[ \t]+")
+
+Block = Tuple[bool, str]  # (opens a section, text)
+
+
+class ChunkingService:
+    """
+    Splits long prompts into chunks on structural boundaries.
+
+    Prompts are cut into blocks at headings and blank lines, with fenced code
+    kept whole, and blocks are packed into chunks of at most CHUNK_MAX_TOKENS.
+    A chunk closes early at a heading once it is half full, so sections stay
+    together. A prose block larger than the limit is cut at line breaks, and
+    lines still too large at sentence ends; fenced code is never cut.
+    """
+
+    def __init__(self, token_service: Optional[TokenService] = None):
+        self.token_service = token_service or TokenService()
+
+    def split(self, prompt: str, model: str, max_tokens: Optional[int] = None) -> List[str]:
+        """Split a prompt into chunks that rejoin with blank lines"""
+        max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        chunks, current, size = [], [], 0
+
+        for heading, block in self.blocks(prompt):
+            tokens = self.token_service.count_tokens(block, model)
+            if current and (size + tokens > max_tokens or (heading and size >= max_tokens // 2)):
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            if tokens > max_tokens and not _FENCE.match(block):
+                # Oversized pieces are chunks of their own
+                pieces = self._cut(block, model, max_tokens)
+                chunks.extend(pieces[:-1])
+                block = pieces[-1]
+                tokens = self.token_service.count_tokens(block, model)
+            current.append(block)
+            size += tokens
+
+        if current:
+            chunks.append("\n\n".join(current))
+        return chunks
+
+    def _cut(self, text: str, model: str, max_tokens: int) -> List[str]:
+        """Pack a block's lines, or a line's sentences, into pieces of at most max_tokens"""
+        separator, units = ("\n", text.split("\n")) if "\n" in text else (" ", _SENTENCE_BREAK.split(text))
+        pieces, current, size = [], [], 0
+
+        for unit in units:
+            tokens = self.token_service.count_tokens(unit, model)
+            if current and size + tokens > max_tokens:
+                pieces.append(separator.join(current))
+                current, size = [], 0
+            if tokens > max_tokens and separator == "\n":
+                sentences = self._cut(unit, model, max_tokens)
+                pieces.extend(sentences[:-1])
+                unit = sentences[-1]
+                tokens = self.token_service.count_tokens(unit, model)
+            current.append(unit)
+            size += tokens
+
+        if current:
+            pieces.append(separator.join(current))
+        return pieces
+
+    @staticmethod
+    def blocks(prompt: str) -> List[Block]:
+        """Paragraphs, lists, code blocks and headings, in order"""
+        blocks, current, in_fence = [], [], False
+
+        def close():
+            if current:
+                blocks.append((bool(_HEADING.match(current[0])), "\n".join(current)))
+                current.clear()
+
+        for line in prompt.split("\n"):
+            if _FENCE.match(line):
+                if not in_fence:
+                    close()
+                in_fence = not in_fence
+                current.append(line)
+            elif in_fence:
+                current.append(line)
+            elif not line.strip():
+                close()
+            else:
+                if _HEADING.match(line):
+                    close()
+                current.append(line)
+
+        close()
+        return blocks
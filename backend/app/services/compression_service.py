@@ -0,0 +1,197 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+from app.services.token_service import TokenService
+
+# Phrases that can be dropped without changing what is asked. Words that can
+# carry content are deliberately absent: intensifiers under a negation ("not
+# very important"), manner adverbs ("respond kindly") and time phrases that
+# double as idioms ("send it at the end of the day").
+FILLER_PHRASES = (
+    "please note that", "it is important to note that", "it should be noted that",
+    "keep in mind that", "i would like you to", "i want you to", "i need you to",
+    "can you please", "could you please", "would you please", "please kindly",
+    "basically", "as you can see", "needless to say",
+)
+
+# Wordy phrases and their shorter equivalents
+SUBSTITUTIONS = (
+    ("in order to", "to"),
+    ("due to the fact that", "because"),
+    ("owing to the fact that", "because"),
+    ("in spite of the fact that", "although"),
+    ("in the event that", "if"),
+    ("at this point in time", "now"),
+    ("at the present time", "now"),
+    ("a large number of", "many"),
+    ("a majority of", "most"),
+    ("a small number of", "few"),
+    ("with regard to", "about"),
+    ("with respect to", "about"),
+    ("in relation to", "about"),
+    ("for the purpose of", "for"),
+    ("make sure that", "ensure"),
+    ("is able to", "can"),
+    ("are able to", "can"),
+    ("has the ability to", "can"),
+    ("have the ability to", "can"),
+    ("prior to", "before"),
+    ("subsequent to", "after"),
+    ("in addition to", "besides"),
+    ("each and every", "every"),
+    ("first and foremost", "first"),
+)
+
+# Characters after which the next word starts a sentence or list item
+SENTENCE_ENDS = ".!?:\n-"
+
+# Sentences shorter than this are too generic to count as repeats
+MIN_DUPLICATE_WORDS = 4
+
+_CODE_FENCE = re.compile(r"(```.*?(?:```|$))", re.DOTALL)
+_BULLET = re.compile(r"^([ \t]*)(?:[*+•▪◦–—]|-)[ \t]+", re.MULTILINE)
+_NUMBERED = re.compile(r"^([ \t]*)(\d+)[)\]][ \t]+", re.MULTILINE)
+_LIST_MARKER = re.compile(r"^[ \t]*(?:-|\d+\.)[ \t]+")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])[ \t]+")
+_INNER_SPACE = re.compile(r"(?<=\S)[ \t]{2,}")
+_TRAILING_SPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"(?<=\w)[ \t]+(?=[,.;:!?])")
+_DANGLING_COMMA = re.compile(r",[ \t]*(?=[.;:!?])")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+class CompressionResult(NamedTuple):
+    text: str
+    original_tokens: int
+    tokens: int
+    applied: Dict[str, int]  # Edits made per rule
+
+    @property
+    def token_delta(self) -> int:
+        return self.original_tokens - self.tokens
+
+    @property
+    def reduction(self) -> float:
+        return self.token_delta / self.original_tokens if self.original_tokens > 0 else 0.0
+
+
+Rule = Tuple[str, Pattern, str]  # (phrase, pattern, replacement)
+
+
+class CompressionService:
+    """
+    Deterministic, local prompt compression.
+
+    Normalizes list markers, drops filler phrases, shortens wordy phrases,
+    removes sentences that immediately repeat the previous one and collapses
+    whitespace; fenced code blocks are left untouched. Repeats further apart,
+    such as the Input/Output lines of few-shot examples, are kept. Phrase rules are kept per model only when the model's
+    tokenizer makes the rewrite cheaper, using TokenService cost tables.
+    """
+
+    def __init__(self, token_service: Optional[TokenService] = None):
+        self.token_service = token_service or TokenService()
+        self._rules: Dict[str, List[Rule]] = {}
+
+    def rules(self, model: str) -> List[Rule]:
+        """Phrase rules that save tokens for the model, longest phrase first"""
+        if model not in self._rules:
+            costs = self.token_service.token_costs(
+                FILLER_PHRASES + tuple(text for pair in SUBSTITUTIONS for text in pair),
+                model
+            )
+            candidates = [(phrase, "") for phrase in FILLER_PHRASES] + list(SUBSTITUTIONS)
+            self._rules[model] = [
+                (phrase, re.compile(rf"\b{re.escape(phrase)}\b(,?[ \t]*)(\w?)", re.IGNORECASE), replacement)
+                for phrase, replacement in sorted(candidates, key=lambda rule: -len(rule[0]))
+                if costs[phrase] > (costs[replacement] if replacement else 0)
+            ]
+        return self._rules[model]
+
+    def compress(self, prompt: str, model: str) -> CompressionResult:
+        """Compress a prompt and measure the tokens saved"""
+        applied: Dict[str, int] = {}
+
+        # Odd segments are fenced code, which is whitespace- and wording-sensitive
+        segments = _CODE_FENCE.split(prompt)
+        for index in range(0, len(segments), 2):
+            text = self._normalize_lists(segments[index], applied)
+            text = self._apply_rules(text, model, applied)
+            text = self._drop_repeats(text, applied)
+            segments[index] = self._collapse_whitespace(text)
+
+        text = _BLANK_LINES.sub("\n\n", "".join(segments)).strip()
+        return CompressionResult(
+            text=text,
+            original_tokens=self.token_service.count_tokens(prompt, model),
+            tokens=self.token_service.count_tokens(text, model),
+            applied=applied
+        )
+
+    @staticmethod
+    def join_chunks(chunks: List[str]) -> Tuple[str, int]:
+        """
+        Rejoin independently rewritten chunks with blank lines, dropping a
+        chunk's opening paragraph when it exactly repeats the closing paragraph
+        of the chunk before it; returns the count dropped
+        """
+        joined: List[str] = []
+        repeats = 0
+        for chunk in chunks:
+            paragraphs = chunk.strip().split("\n\n")
+            if joined and paragraphs[0].strip() == joined[-1].strip():
+                paragraphs = paragraphs[1:]
+                repeats += 1
+            joined.extend(paragraphs)
+        return "\n\n".join(joined), repeats
+
+    @staticmethod
+    def _normalize_lists(text: str, applied: Dict[str, int]) -> str:
+        text, bullets = _BULLET.subn(r"\1- ", text)
+        text, numbers = _NUMBERED.subn(r"\1\2. ", text)
+        if bullets + numbers:
+            applied["list_markers"] = applied.get("list_markers", 0) + bullets + numbers
+        return text
+
+    def _apply_rules(self, text: str, model: str, applied: Dict[str, int]) -> str:
+        for phrase, pattern, replacement in self.rules(model):
+            def substitute(match):
+                if replacement:
+                    shorter = replacement.capitalize() if match.group(0)[0].isupper() else replacement
+                    return shorter + match.group(1) + match.group(2)
+                # A dropped phrase that opened a sentence hands its capital on
+                before = match.string[max(0, match.start() - 16):match.start()].rstrip(" \t")
+                return match.group(2).upper() if not before or before[-1] in SENTENCE_ENDS else match.group(2)
+
+            text, count = pattern.subn(substitute, text)
+            if count:
+                applied[phrase] = applied.get(phrase, 0) + count
+        return text
+
+    @staticmethod
+    def _drop_repeats(text: str, applied: Dict[str, int]) -> str:
+        """Drop sentences identical to the one before them, across line and paragraph breaks"""
+        lines, previous = [], None
+        for line in text.split("\n"):
+            marker = _LIST_MARKER.match(line)
+            body = line[marker.end():] if marker else line
+
+            kept = []
+            for sentence in _SENTENCE_BREAK.split(body):
+                key = " ".join(sentence.lower().rstrip(".!?;:").split())
+                if key and key == previous and len(key.split()) >= MIN_DUPLICATE_WORDS:
+                    applied["repeated_instructions"] = applied.get("repeated_instructions", 0) + 1
+                    continue
+                if key:
+                    previous = key
+                kept.append(sentence)
+
+            if kept or not body.strip():
+                lines.append((marker.group(0) if marker else "") + " ".join(kept))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _collapse_whitespace(text: str) -> str:
+        text = _INNER_SPACE.sub(" ", text)
+        text = _SPACE_BEFORE_PUNCTUATION.sub("", text)
+        text = _DANGLING_COMMA.sub("", text)
+        return _TRAILING_SPACE.sub("", text)
@@ -1,18 +1,85 @@
+import asyncio
 import time
-from typing import Dict, Any, Optional
+from textwrap import dedent
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models.prompt import Prompt, Optimization, OptimizationType
 from app.services.token_service import TokenService
 from app.services.ai_service import AIService
 from app.services.quality_service import QualityService
+from app.services.compression_service import CompressionService
+from app.services.chunking_service import ChunkingService
+
+# Fixed system prompts, built once so every call sends the same prefix;
+# per-call parameters are sent as instructions after it
+SYSTEM_PROMPTS = {
+    OptimizationType.TOKEN_REDUCTION: dedent("""
+        You are an expert at optimizing prompts to reduce token usage while maintaining effectiveness.
+        Reduce the token count while preserving the core meaning and intent.
+        
+        Guidelines:
+        - Remove redundant words and phrases
+        - Use more concise language
+        - Maintain clarity and specificity
+        - Preserve all essential information
+        - Use abbreviations where appropriate
+        
+        Return only the optimized prompt, no explanations.
+    """).strip(),
+    OptimizationType.QUALITY_ENHANCEMENT: dedent("""
+        You are an expert at improving prompt quality and effectiveness.
+        Enhance the prompt to achieve the quality score you are given.
+        
+        Focus on:
+        - Clarity and precision
+        - Specificity and context
+        - Logical structure
+        - Actionable instructions
+        - Appropriate tone and style
+        
+        Return only the enhanced prompt, no explanations.
+    """).strip(),
+    OptimizationType.CLARITY_IMPROVEMENT: dedent("""
+        You are an expert at improving prompt clarity and understandability.
+        Make the prompt clearer, more specific, and easier to understand.
+        
+        Focus on:
+        - Clear and unambiguous language
+        - Specific instructions and requirements
+        - Logical flow and structure
+        - Removing ambiguity
+        - Adding context where needed
+        
+        Return only the improved prompt, no explanations.
+    """).strip(),
+    OptimizationType.MODEL_ADAPTATION: dedent("""
+        You are an expert at adapting prompts for different AI models.
+        Adapt the prompt for the model you are given to maximize effectiveness.
+        
+        Consider:
+        - Model-specific capabilities and limitations
+        - Optimal prompt structure for this model
+        - Model-specific best practices
+        - Token efficiency for this model
+        
+        Return only the adapted prompt, no explanations.
+    """).strip(),
+}
 
 
 class OptimizationService:
-    def __init__(self):
-        self.token_service = TokenService()
-        self.ai_service = AIService()
-        self.quality_service = QualityService()
+    def __init__(
+        self,
+        token_service: Optional[TokenService] = None,
+        ai_service: Optional[AIService] = None,
+        quality_service: Optional[QualityService] = None
+    ):
+        self.token_service = token_service or TokenService()
+        self.ai_service = ai_service or AIService()
+        self.quality_service = quality_service or QualityService(ai_service=self.ai_service)
+        self.compression_service = CompressionService(self.token_service)
+        self.chunking_service = ChunkingService(self.token_service)
     
     async def optimize_prompt(
         self,
@@ -22,12 +89,27 @@ class OptimizationService:
         target_model: Optional[str] = None,
         reduction_target: Optional[float] = None,
         quality_threshold: Optional[float] = None,
+        candidates: int = 1,
+        candidate_models: Optional[List[str]] = None,
         db: Session = None
     ) -> Dict[str, Any]:
         """
-        Optimize a prompt using AI
+        Optimize a prompt using AI.
+
+        Only the rewrite is on the critical path: the original prompt is
+        measured while it runs, and measuring and scoring the result run
+        concurrently. Everything is persisted in a single transaction, with
+        per-stage timings recorded on the optimization.
+
+        With several `candidates` or `candidate_models` (which take the place
+        of target_model), rewrites are generated concurrently and the best
+        trade-off between tokens and quality is kept.
         """
         start_time = time.time()
+        models = candidate_models or [target_model or settings.DEFAULT_MODEL]
+        model = models[0]
+        timings = {}
+        details = {"reduction_target": reduction_target, "quality_threshold": quality_threshold}
         
         # Get the prompt
         prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
@@ -35,47 +117,63 @@ class OptimizationService:
             raise ValueError("Prompt not found")
         
         original_prompt = prompt.original_prompt
-        original_tokens = self.token_service.count_tokens(original_prompt, target_model or settings.DEFAULT_MODEL)
+        details["quality_floor"] = self._quality_floor(
+            optimization_type,
+            quality_threshold,
+            await asyncio.to_thread(self.quality_service.rule_score, original_prompt)
+        )
+        original_measurement = asyncio.create_task(
+            self._timed(timings, "original_tokens", asyncio.to_thread(self._measure, original_prompt, model))
+        )
         
-        # Determine optimization strategy
-        if optimization_type == OptimizationType.TOKEN_REDUCTION:
-            optimized_prompt = await self._reduce_tokens(
-                original_prompt, 
-                reduction_target or settings.DEFAULT_TOKEN_REDUCTION_TARGET,
-                target_model
-            )
-        elif optimization_type == OptimizationType.QUALITY_ENHANCEMENT:
-            optimized_prompt = await self._enhance_quality(
-                original_prompt,
-                quality_threshold or 8.0,
-                target_model
-            )
-        elif optimization_type == OptimizationType.CLARITY_IMPROVEMENT:
-            optimized_prompt = await self._improve_clarity(
-                original_prompt,
-                target_model
-            )
-        elif optimization_type == OptimizationType.MODEL_ADAPTATION:
-            optimized_prompt = await self._adapt_for_model(
-                original_prompt,
-                target_model
+        try:
+            if candidates > 1 or len(models) > 1:
+                optimized_prompt, model = await self._timed(timings, "rewrite", self._best_of(
+                    original_prompt,
+                    optimization_type,
+                    models,
+                    candidates,
+                    reduction_target,
+                    quality_threshold,
+                    timings,
+                    details
+                ))
+            else:
+                optimized_prompt = await self._timed(timings, "rewrite", self._rewrite(
+                    original_prompt,
+                    optimization_type,
+                    model,
+                    reduction_target,
+                    quality_threshold,
+                    timings,
+                    details
+                ))
+        except BaseException:
+            original_measurement.cancel()
+            raise
+        
+        if model != models[0]:
+            # The winning candidate came from another model; measure against its tokenizer and pricing
+            original_measurement.cancel()
+            original_measurement = asyncio.create_task(
+                self._timed(timings, "original_tokens", asyncio.to_thread(self._measure, original_prompt, model))
             )
-        else:
-            raise ValueError(f"Unsupported optimization type: {optimization_type}")
+        
+        # Measure the result and assess its quality concurrently
+        (original_tokens, original_cost), (optimized_tokens, optimized_cost), quality_scores = await asyncio.gather(
+            original_measurement,
+            self._timed(timings, "optimized_tokens", asyncio.to_thread(self._measure, optimized_prompt, model)),
+            self._timed(timings, "quality", self.quality_service.assess_prompt_quality(optimized_prompt))
+        )
+        
+        if "candidates" not in details:
+            details["tokens_spent"] = self._tokens_spent(original_tokens, optimized_tokens, details)
         
         # Calculate metrics
-        optimized_tokens = self.token_service.count_tokens(optimized_prompt, target_model or settings.DEFAULT_MODEL)
         token_reduction = original_tokens - optimized_tokens
         token_reduction_percentage = (token_reduction / original_tokens) * 100 if original_tokens > 0 else 0
-        
-        # Calculate costs
-        original_cost = self.token_service.calculate_cost(original_tokens, target_model or settings.DEFAULT_MODEL)
-        optimized_cost = self.token_service.calculate_cost(optimized_tokens, target_model or settings.DEFAULT_MODEL)
         cost_savings = original_cost - optimized_cost
         
-        # Quality assessment
-        quality_scores = await self.quality_service.assess_prompt_quality(optimized_prompt)
-        
         processing_time = time.time() - start_time
         
         # Create optimization record
@@ -83,7 +181,7 @@ class OptimizationService:
             prompt_id=prompt_id,
             user_id=user_id,
             optimization_type=optimization_type,
-            model_used=target_model or settings.DEFAULT_MODEL,
+            model_used=model,
             original_prompt=original_prompt,
             optimized_prompt=optimized_prompt,
             original_tokens=original_tokens,
@@ -97,12 +195,11 @@ class OptimizationService:
             optimized_cost=optimized_cost,
             cost_savings=cost_savings,
             cost_savings_percentage=(cost_savings / original_cost) * 100 if original_cost > 0 else 0,
-            processing_time=processing_time
+            optimization_settings=details,
+            processing_time=processing_time,
+            stage_timings=timings
         )
-        
         db.add(optimization)
-        db.commit()
-        db.refresh(optimization)
         
         # Update prompt
         prompt.optimized_prompt = optimized_prompt
@@ -112,15 +209,21 @@ class OptimizationService:
         prompt.clarity_score = quality_scores.get('clarity', 0)
         prompt.specificity_score = quality_scores.get('specificity', 0)
         prompt.overall_quality_score = quality_scores.get('overall', 0)
+        prompt.ai_quality_score = quality_scores.get('ai')
         prompt.status = "completed"
         
+        # One transaction; read the generated id before commit expires it
+        db.flush()
+        optimization_id = optimization.id
+        created_at = optimization.created_at
         db.commit()
         
         return {
-            "id": optimization.id,
+            "id": optimization_id,
             "prompt_id": prompt_id,
+            "user_id": user_id,
             "optimization_type": optimization_type,
-            "model_used": target_model or settings.DEFAULT_MODEL,
+            "model_used": model,
             "original_prompt": original_prompt,
             "optimized_prompt": optimized_prompt,
             "original_tokens": original_tokens,
@@ -134,76 +237,463 @@ class OptimizationService:
             "optimized_cost": optimized_cost,
             "cost_savings": cost_savings,
             "cost_savings_percentage": (cost_savings / original_cost) * 100 if original_cost > 0 else 0,
-            "processing_time": processing_time
+            "optimization_settings": details,
+            "processing_time": processing_time,
+            "stage_timings": timings,
+            "created_at": created_at.isoformat() if created_at else None
         }
     
-    async def _reduce_tokens(self, prompt: str, reduction_target: float, model: str) -> str:
-        """Reduce token count while maintaining quality"""
-        system_prompt = f"""
-        You are an expert at optimizing prompts to reduce token usage while maintaining effectiveness.
-        Reduce the token count by approximately {reduction_target * 100:.0f}% while preserving the core meaning and intent.
-        
-        Guidelines:
-        - Remove redundant words and phrases
-        - Use more concise language
-        - Maintain clarity and specificity
-        - Preserve all essential information
-        - Use abbreviations where appropriate
+    @staticmethod
+    async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable) -> Any:
+        """Await a stage and record its duration in seconds"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[stage] = round(time.perf_counter() - started, 4)
+    
+    def _measure(self, text: str, model: str) -> Tuple[int, float]:
+        """Token count and cost of a text; CPU-bound, run in a worker thread"""
+        tokens = self.token_service.count_tokens(text, model)
+        return tokens, self.token_service.calculate_cost(tokens, model)
+    
+    async def _rewrite(
+        self,
+        prompt: str,
+        optimization_type: OptimizationType,
+        model: str,
+        reduction_target: Optional[float],
+        quality_threshold: Optional[float],
+        timings: Dict[str, float],
+        details: Dict[str, Any]
+    ) -> str:
+        """Rewrite a prompt, chunk by chunk when it is longer than CHUNKED_OPTIMIZATION_THRESHOLD tokens"""
+        if self.token_service.count_tokens(prompt, model) > settings.CHUNKED_OPTIMIZATION_THRESHOLD:
+            return await self._map_reduce(
+                prompt,
+                optimization_type,
+                model,
+                reduction_target,
+                quality_threshold,
+                timings,
+                details
+            )
+        return await self._apply_strategy(
+            prompt,
+            optimization_type,
+            model,
+            reduction_target,
+            quality_threshold,
+            timings,
+            details
+        )
+    
+    async def _map_reduce(
+        self,
+        prompt: str,
+        optimization_type: OptimizationType,
+        model: str,
+        reduction_target: Optional[float],
+        quality_threshold: Optional[float],
+        timings: Dict[str, float],
+        details: Dict[str, Any]
+    ) -> str:
+        """
+        Split a long prompt on structural boundaries, rewrite the chunks
+        concurrently and reassemble them.
         
-        Return only the optimized prompt, no explanations.
+        Chunk calls share the AI service's per-provider slots, so wall-clock
+        time follows the slowest chunk rather than the prompt size. A chunk
+        whose rewrite fails is kept as it was. Because chunks are rewritten
+        independently, a final pass drops a paragraph repeated exactly across
+        a chunk seam.
         """
+        chunks = self.chunking_service.split(prompt, model)
         
-        return await self.ai_service.generate_text(system_prompt, prompt, model)
-    
-    async def _enhance_quality(self, prompt: str, quality_threshold: float, model: str) -> str:
-        """Enhance prompt quality and effectiveness"""
-        system_prompt = f"""
-        You are an expert at improving prompt quality and effectiveness.
-        Enhance the prompt to achieve a quality score of at least {quality_threshold}/10.
+        async def rewrite_chunk(chunk):
+            started = time.perf_counter()
+            chunk_details = {"tokens": self.token_service.count_tokens(chunk, model)}
+            try:
+                text = await self._apply_strategy(
+                    chunk,
+                    optimization_type,
+                    model,
+                    reduction_target,
+                    quality_threshold,
+                    {},
+                    chunk_details
+                )
+            except Exception as e:
+                text = chunk
+                chunk_details["error"] = str(e)
+            chunk_details["seconds"] = round(time.perf_counter() - started, 4)
+            return text, chunk_details
         
-        Focus on:
-        - Clarity and precision
-        - Specificity and context
-        - Logical structure
-        - Actionable instructions
-        - Appropriate tone and style
+        results = await self._timed(timings, "chunks", asyncio.gather(*(rewrite_chunk(chunk) for chunk in chunks)))
+        if all("error" in chunk_details for _, chunk_details in results):
+            raise ValueError(f"All {len(chunks)} chunks failed: {results[0][1]['error']}")
         
-        Return only the enhanced prompt, no explanations.
-        """
+        started = time.perf_counter()
+        text, repeats = self.compression_service.join_chunks([text for text, _ in results])
+        timings["consistency_pass"] = round(time.perf_counter() - started, 4)
         
-        return await self.ai_service.generate_text(system_prompt, prompt, model)
+        details["chunks"] = [chunk_details for _, chunk_details in results]
+        details["cross_chunk_repeats"] = repeats
+        return text
     
-    async def _improve_clarity(self, prompt: str, model: str) -> str:
-        """Improve prompt clarity and understandability"""
-        system_prompt = """
-        You are an expert at improving prompt clarity and understandability.
-        Make the prompt clearer, more specific, and easier to understand.
+    async def _apply_strategy(
+        self,
+        prompt: str,
+        optimization_type: OptimizationType,
+        model: str,
+        reduction_target: Optional[float],
+        quality_threshold: Optional[float],
+        timings: Dict[str, float],
+        details: Dict[str, Any]
+    ) -> str:
+        """Rewrite a prompt with the strategy for the optimization type"""
+        if optimization_type == OptimizationType.TOKEN_REDUCTION:
+            return await self._compress(
+                prompt, 
+                reduction_target or settings.DEFAULT_TOKEN_REDUCTION_TARGET,
+                quality_threshold,
+                model,
+                timings,
+                details
+            )
+        elif optimization_type == OptimizationType.QUALITY_ENHANCEMENT:
+            return await self._enhance_quality(
+                prompt,
+                quality_threshold or 8.0,
+                model
+            )
+        elif optimization_type == OptimizationType.CLARITY_IMPROVEMENT:
+            return await self._improve_clarity(
+                prompt,
+                model
+            )
+        elif optimization_type == OptimizationType.MODEL_ADAPTATION:
+            return await self._adapt_for_model(
+                prompt,
+                model
+            )
+        else:
+            raise ValueError(f"Unsupported optimization type: {optimization_type}")
+    
+    async def _best_of(
+        self,
+        prompt: str,
+        optimization_type: OptimizationType,
+        models: List[str],
+        count: int,
+        reduction_target: Optional[float],
+        quality_threshold: Optional[float],
+        timings: Dict[str, float],
+        details: Dict[str, Any]
+    ) -> Tuple[str, str]:
+        """
+        Generate `count` rewrites concurrently, spread round-robin over `models`,
+        and return the text and model of the best one.
         
-        Focus on:
-        - Clear and unambiguous language
-        - Specific instructions and requirements
-        - Logical flow and structure
-        - Removing ambiguity
-        - Adding context where needed
+        Each candidate is scored by its reduction against the original prompt
+        and its rule-based quality. The winner is picked from the Pareto front:
+        the shortest acceptable candidate for token reduction, otherwise the
+        highest quality one. Candidates still running are cancelled as soon as
+        a finished one meets the targets and dominates every other finished one.
+        """
+        original_tokens = {model: self.token_service.count_tokens(prompt, model) for model in set(models)}
+        reduction_target = reduction_target or settings.DEFAULT_TOKEN_REDUCTION_TARGET
+        # The same reachable rule-score floor as the single-rewrite path
+        floor = details.get("quality_floor") or self._quality_floor(
+            optimization_type,
+            quality_threshold,
+            await asyncio.to_thread(self.quality_service.rule_score, prompt)
+        )
         
-        Return only the improved prompt, no explanations.
+        candidates = [{"model": models[index % len(models)], "status": "pending"} for index in range(count)]
+        outputs = {}
+        tasks = {
+            asyncio.create_task(self._candidate(prompt, optimization_type, candidate["model"], reduction_target, quality_threshold)): index
+            for index, candidate in enumerate(candidates)
+        }
+        
+        def meets_targets(candidate):
+            if candidate["quality"] < floor:
+                return False
+            return optimization_type != OptimizationType.TOKEN_REDUCTION or candidate["reduction"] >= reduction_target
+        
+        def dominates(a, b):
+            return a["reduction"] >= b["reduction"] and a["quality"] >= b["quality"]
+        
+        def strictly_dominates(a, b):
+            return dominates(a, b) and (a["reduction"] > b["reduction"] or a["quality"] > b["quality"])
+        
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks[task]
+                    candidate = candidates[index]
+                    try:
+                        text, tokens, quality, seconds, candidate_timings, candidate_details = task.result()
+                    except Exception as e:
+                        # The prompt was sent; what came back is unknown
+                        candidate.update(status="failed", error=str(e), tokens_spent=original_tokens[candidate["model"]])
+                        continue
+                    
+                    outputs[index] = (text, candidate_timings, candidate_details)
+                    candidate.update(
+                        status="completed",
+                        tokens=tokens,
+                        reduction=round(1 - tokens / original_tokens[candidate["model"]], 4) if original_tokens[candidate["model"]] > 0 else 0,
+                        quality=quality,
+                        seconds=seconds,
+                        tokens_spent=self._tokens_spent(original_tokens[candidate["model"]], tokens, candidate_details)
+                    )
+                
+                completed = [candidate for candidate in candidates if candidate["status"] == "completed"]
+                if pending and any(
+                    meets_targets(leader) and all(dominates(leader, other) for other in completed)
+                    for leader in completed
+                ):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                candidate = candidates[tasks[task]]
+                candidate.update(status="cancelled", tokens_spent=original_tokens[candidate["model"]])
+        
+        completed = [index for index, candidate in enumerate(candidates) if candidate["status"] == "completed"]
+        if not completed:
+            raise ValueError(f"All {count} candidates failed: {candidates[0].get('error')}")
+        
+        front = [
+            index for index in completed
+            if not any(strictly_dominates(candidates[other], candidates[index]) for other in completed)
+        ]
+        acceptable = [index for index in front if candidates[index]["quality"] >= floor] or front
+        if optimization_type == OptimizationType.TOKEN_REDUCTION:
+            winner = max(acceptable, key=lambda index: (candidates[index]["reduction"], candidates[index]["quality"]))
+        else:
+            winner = max(acceptable, key=lambda index: (candidates[index]["quality"], candidates[index]["reduction"]))
+        
+        for index in front:
+            candidates[index]["pareto"] = True
+        candidates[winner]["selected"] = True
+        
+        text, candidate_timings, candidate_details = outputs[winner]
+        timings.update(candidate_timings)
+        details.update(candidate_details)
+        details["candidates"] = candidates
+        details["tokens_spent"] = sum(candidate["tokens_spent"] for candidate in candidates)
+        return text, candidates[winner]["model"]
+    
+    async def _candidate(
+        self,
+        prompt: str,
+        optimization_type: OptimizationType,
+        model: str,
+        reduction_target: float,
+        quality_threshold: Optional[float]
+    ) -> Tuple[str, int, float, float, Dict[str, float], Dict[str, Any]]:
+        """Generate one rewrite and measure its tokens, rule-based quality and duration"""
+        started = time.perf_counter()
+        timings, details = {}, {}
+        text = await self._rewrite(prompt, optimization_type, model, reduction_target, quality_threshold, timings, details)
+        tokens, quality = await asyncio.to_thread(self._evaluate, text, model)
+        return text, tokens, quality, round(time.perf_counter() - started, 4), timings, details
+    
+    async def _compress(
+        self,
+        prompt: str,
+        reduction_target: float,
+        quality_threshold: Optional[float],
+        model: str,
+        timings: Dict[str, float],
+        details: Dict[str, Any]
+    ) -> str:
+        """
+        Compress locally first and only ask the LLM for whatever reduction is still missing.
+        
+        The local result is kept only if its rule-based quality stays above the
+        floor the LLM loop uses; otherwise the LLM works from the original.
         """
+        started = time.perf_counter()
+        compressed = self.compression_service.compress(prompt, model)
+        prompt_quality, compressed_quality = await asyncio.gather(
+            asyncio.to_thread(self.quality_service.rule_score, prompt),
+            asyncio.to_thread(self.quality_service.rule_score, compressed.text)
+        )
+        timings["local_compression"] = round(time.perf_counter() - started, 4)
+        
+        floor = self._quality_floor(OptimizationType.TOKEN_REDUCTION, quality_threshold, prompt_quality)
+        kept = compressed_quality >= floor
+        details["local_compression"] = {
+            "tokens_saved": compressed.token_delta,
+            "reduction": round(compressed.reduction, 4),
+            "rules": compressed.applied,
+            "quality": compressed_quality,
+            "kept": kept
+        }
+        
+        details["llm_called"] = not kept or compressed.reduction < reduction_target
+        if not details["llm_called"]:
+            return compressed.text
         
-        return await self.ai_service.generate_text(system_prompt, prompt, model)
+        return await self._reduce_tokens(
+            compressed.text if kept else prompt,
+            compressed.original_tokens,
+            reduction_target,
+            floor,
+            model,
+            details
+        )
     
-    async def _adapt_for_model(self, prompt: str, target_model: str) -> str:
-        """Adapt prompt for specific AI model"""
-        system_prompt = f"""
-        You are an expert at adapting prompts for different AI models.
-        Adapt this prompt specifically for {target_model} to maximize effectiveness.
+    async def _reduce_tokens(
+        self,
+        prompt: str,
+        original_tokens: int,
+        reduction_target: float,
+        floor: float,
+        model: str,
+        details: Dict[str, Any]
+    ) -> str:
+        """
+        Reduce token count while maintaining quality.
         
-        Consider:
-        - Model-specific capabilities and limitations
-        - Optimal prompt structure for this model
-        - Model-specific best practices
-        - Token efficiency for this model
+        Each round measures the reduction achieved against the original prompt
+        and the rule-based quality of the result. Short results are sent back
+        for further reduction and results below the rule-score `floor` are retried
+        from the last acceptable text with instructions to keep more, for at most
+        REDUCTION_MAX_ITERATIONS calls. Stops as soon as both targets are met
+        and returns the shortest acceptable text.
+        """
+        best = prompt
+        best_tokens = self.token_service.count_tokens(prompt, model)
+        target_tokens = original_tokens * (1 - reduction_target)
         
-        Return only the adapted prompt, no explanations.
+        source, feedback = prompt, None
+        loop = {"iterations": 0, "target_met": False, "input_tokens": 0, "output_tokens": 0}
+        details["reduction_loop"] = loop
+        
+        while loop["iterations"] < settings.REDUCTION_MAX_ITERATIONS:
+            source_tokens = self.token_service.count_tokens(source, model)
+            system_prompt = SYSTEM_PROMPTS[OptimizationType.TOKEN_REDUCTION]
+            instructions = self._reduction_instructions(max(1 - target_tokens / max(source_tokens, 1), 0.05), feedback)
+            result = (await self.ai_service.generate_text(
+                system_prompt,
+                source,
+                model,
+                max_tokens=self._output_budget(source_tokens),
+                instructions=instructions
+            )).strip()
+            tokens, quality = await asyncio.to_thread(self._evaluate, result, model)
+            
+            loop["iterations"] += 1
+            loop["input_tokens"] += self.token_service.count_tokens(f"{system_prompt}\n{instructions}", model) + source_tokens
+            loop["output_tokens"] += tokens
+            
+            if quality < floor:
+                # Too aggressive; retry from the last acceptable text
+                source = best
+                feedback = (
+                    f"The previous attempt dropped essential information (quality {quality:.1f}, "
+                    f"minimum {floor:.1f}). Remove less and keep every requirement and constraint."
+                )
+                continue
+            
+            if tokens < best_tokens:
+                best, best_tokens = result, tokens
+            if best_tokens <= target_tokens:
+                loop["target_met"] = True
+                break
+            
+            source = best
+            feedback = (
+                f"The previous attempt was still {best_tokens - target_tokens:.0f} tokens over "
+                f"the target of {target_tokens:.0f}."
+            )
+        
+        loop["achieved_reduction"] = round(1 - best_tokens / original_tokens, 4) if original_tokens > 0 else 0
+        loop["quality_floor"] = floor
+        loop["estimated_cost"] = round(self.token_service.calculate_call_cost(
+            loop["input_tokens"],
+            loop["output_tokens"],
+            model
+        ), 6)
+        return best
+    
+    @staticmethod
+    def _tokens_spent(prompt_tokens: int, output_tokens: int, details: Dict[str, Any]) -> int:
+        """
+        Quota tokens used by one rewrite: the prompt and the result, or what
+        the reduction loops sent and received when they made several calls
+        """
+        loops = [details.get("reduction_loop")] + [chunk.get("reduction_loop") for chunk in details.get("chunks", [])]
+        llm_tokens = sum(loop["input_tokens"] + loop["output_tokens"] for loop in loops if loop)
+        return max(prompt_tokens + output_tokens, llm_tokens)
+    
+    def _quality_floor(
+        self,
+        optimization_type: OptimizationType,
+        quality_threshold: Optional[float],
+        prompt_quality: float
+    ) -> float:
         """
+        Rule-score floor for rewrites of a prompt whose rule score is prompt_quality.
         
-        return await self.ai_service.generate_text(system_prompt, prompt, target_model) 
\ No newline at end of file
+        Thresholds use the 1-10 quality scale and are mapped onto the narrower
+        span of rule scores. An explicit quality_threshold applies as given; the
+        reduction default (REDUCTION_MIN_QUALITY) only asks a prompt that
+        already scores below it to keep its own score.
+        """
+        if quality_threshold:
+            return self.quality_service.rule_threshold(quality_threshold)
+        if optimization_type == OptimizationType.TOKEN_REDUCTION:
+            return min(self.quality_service.rule_threshold(settings.REDUCTION_MIN_QUALITY), prompt_quality)
+        return self.quality_service.rule_threshold(8.0)
+    
+    def _evaluate(self, text: str, model: str) -> Tuple[int, float]:
+        """Token count and rule-based quality score of a text"""
+        return self.token_service.count_tokens(text, model), self.quality_service.rule_score(text)
+    
+    @staticmethod
+    def _output_budget(input_tokens: int) -> int:
+        """max_tokens for rewriting a text of input_tokens, never below generate_text's default of 2000"""
+        budget = max(int(input_tokens * settings.REWRITE_OUTPUT_TOKEN_RATIO), 2000)
+        return min(budget, settings.REWRITE_MAX_OUTPUT_TOKENS)
+    
+    @staticmethod
+    def _reduction_instructions(reduction_target: float, feedback: Optional[str] = None) -> str:
+        instructions = f"Reduce the token count by approximately {reduction_target * 100:.0f}%."
+        return f"{instructions}\n{feedback}" if feedback else instructions
+    
+    async def _enhance_quality(self, prompt: str, quality_threshold: float, model: str) -> str:
+        """Enhance prompt quality and effectiveness"""
+        return await self.ai_service.generate_text(
+            SYSTEM_PROMPTS[OptimizationType.QUALITY_ENHANCEMENT],
+            prompt,
+            model,
+            max_tokens=self._output_budget(self.token_service.count_tokens(prompt, model)),
+            instructions=f"Enhance the prompt to achieve a quality score of at least {quality_threshold}/10."
+        )
+    
+    async def _improve_clarity(self, prompt: str, model: str) -> str:
+        """Improve prompt clarity and understandability"""
+        return await self.ai_service.generate_text(
+            SYSTEM_PROMPTS[OptimizationType.CLARITY_IMPROVEMENT],
+            prompt,
+            model,
+            max_tokens=self._output_budget(self.token_service.count_tokens(prompt, model))
+        )
+    
+    async def _adapt_for_model(self, prompt: str, target_model: str) -> str:
+        """Adapt prompt for specific AI model"""
+        return await self.ai_service.generate_text(
+            SYSTEM_PROMPTS[OptimizationType.MODEL_ADAPTATION],
+            prompt,
+            target_model,
+            max_tokens=self._output_budget(self.token_service.count_tokens(prompt, target_model)),
+            instructions=f"Adapt this prompt specifically for {target_model} to maximize effectiveness."
+        ) 
\ No newline at end of file
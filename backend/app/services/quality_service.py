@@ -1,193 +1,357 @@
 import re
-from typing import Dict, Any
+from collections import Counter
+from datetime import datetime, date as date_type
+from typing import Dict, Any, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+import structlog
+from app.core.config import settings
+from app.core.database import redis_client
 from app.services.ai_service import AIService
 
+logger = structlog.get_logger()
+
+NEUTRAL_AI_SCORE = 5.0  # Stands in for the AI score when there is none
+
+# Outcomes of the AI judge step, counted per day
+JUDGE_SKIPPED = "skipped"  # Rule-based score was conclusive
+JUDGE_CALLED = "called"
+JUDGE_FAILED = "failed"  # Judge errored; rule-based score used
+JUDGE_COUNTER_KEY = "quality:judge:{date}"
+JUDGE_COUNTER_TTL = 30 * 24 * 3600
+
+# Indicator lexicons; each term counts once per prompt however often it occurs
+CLARITY_TERMS = ('clearly', 'specifically', 'precisely', 'exactly', 'in detail')
+AMBIGUITY_TERMS = ('maybe', 'perhaps', 'possibly', 'might', 'could', 'somehow')
+QUANTITY_TERMS = ('exactly', 'precisely', 'specifically', 'in particular')
+VAGUE_TERMS = ('thing', 'stuff', 'something', 'anything', 'everything', 'nothing')
+CONNECTOR_TERMS = ('because', 'therefore', 'however', 'although', 'furthermore', 'additionally')
+ACTION_TERMS = ('create', 'generate', 'write', 'analyze', 'explain', 'describe', 'compare')
+
+LEXICONS = (CLARITY_TERMS, AMBIGUITY_TERMS, QUANTITY_TERMS, VAGUE_TERMS, CONNECTOR_TERMS, ACTION_TERMS)
+
+# Lexicon indexes per term, e.g. 'exactly' -> (0, 2)
+_TERM_LEXICONS = {
+    term: tuple(index for index, lexicon in enumerate(LEXICONS) if term in lexicon)
+    for lexicon in LEXICONS for term in lexicon
+}
+
+# Two-word terms, checked against the text only when both words occur
+_PHRASES = {
+    term: (term.split(), re.compile(r"\b" + term.replace(" ", r"\s+") + r"\b", re.IGNORECASE))
+    for term in _TERM_LEXICONS if " " in term
+}
+
+# Word characters and runs of sentence punctuation are the only tokens; every
+# other feature is derived from the counted vocabulary
+_TOKEN = re.compile(r"\w+|[.!?]+")
+_PROPER_NOUN = re.compile(r"[A-Z][a-z]+")
+_FOUR_DIGITS = re.compile(r"\d{4}")
+_SHORT_DATE = re.compile(r"\d{1,2}/\d{1,2}|\d{1,2}-\d{1,2}")
+_LIST_ITEM = re.compile(r"^\s*[-*•]\s|^\s*\d+\.", re.MULTILINE)
+
+
+class PromptFeatures(NamedTuple):
+    """
+    Rule-based features of a prompt, in scoring order
+    """
+    word_count: int
+    sentence_count: int  # Segments between runs of . ! ?
+    avg_sentence_length: float  # Words per segment
+    paragraph_count: int
+    proper_noun_count: int
+    has_numbers: bool
+    has_dates: bool
+    has_questions: bool
+    has_lists: bool
+    clarity_terms: int
+    ambiguity_terms: int
+    quantity_terms: int
+    vague_terms: int
+    connector_terms: int
+    action_terms: int
+
+
+def analyze(prompt: str) -> PromptFeatures:
+    """
+    Extract every rule-based feature of a prompt.
+
+    The text is tokenized once; lexicon terms, proper nouns, numbers and
+    sentence ends are then looked up per distinct token rather than rescanning
+    the prompt for each indicator.
+    """
+    vocabulary = Counter(_TOKEN.findall(prompt))
+
+    ends = proper_nouns = 0
+    has_numbers = has_dates = False
+    words = set()
+    for token, count in vocabulary.items():
+        if token[0] in ".!?":
+            ends += count
+            continue
+        words.add(token.lower())
+        if _PROPER_NOUN.fullmatch(token):
+            proper_nouns += count
+        elif not token.isalpha() and not has_dates:
+            has_digits = any(character.isdigit() for character in token)
+            has_numbers = has_numbers or has_digits
+            has_dates = has_digits and bool(_FOUR_DIGITS.search(token))
+
+    if has_numbers and not has_dates:
+        has_dates = bool(_SHORT_DATE.search(prompt))
+
+    terms = words.intersection(_TERM_LEXICONS)
+    for term, (parts, pattern) in _PHRASES.items():
+        if words.issuperset(parts) and pattern.search(prompt):
+            terms.add(term)
+
+    lexicon_counts = [0] * len(LEXICONS)
+    for term in terms:
+        for index in _TERM_LEXICONS[term]:
+            lexicon_counts[index] += 1
+
+    word_count = len(prompt.split())
+    sentence_count = ends + 1
+    return PromptFeatures(
+        word_count,
+        sentence_count,
+        word_count / sentence_count,
+        prompt.count("\n\n") + 1,
+        proper_nouns,
+        has_numbers,
+        has_dates,
+        "?" in prompt,
+        bool(_LIST_ITEM.search(prompt)),
+        *lexicon_counts
+    )
+
+
+def feature_matrix(prompts: Sequence[str]) -> np.ndarray:
+    """
+    Features of many prompts as an (N, len(PromptFeatures)) float matrix
+    """
+    return np.array([analyze(prompt) for prompt in prompts], dtype=float).reshape(-1, len(PromptFeatures._fields))
+
 
 class QualityService:
-    def __init__(self):
-        self.ai_service = AIService()
+    def __init__(self, weights: Optional[Sequence[float]] = None, redis=None, ai_service: Optional[AIService] = None):
+        self.ai_service = ai_service or AIService()
+        self.redis = redis or redis_client
+        # AI, clarity, specificity and structure weights of the overall score
+        self.weights = np.asarray(settings.QUALITY_SCORE_WEIGHTS if weights is None else weights, dtype=float)
+        # Rule-only scores re-weight the other three components to sum to one,
+        # rather than holding the AI component at a neutral value
+        self.rule_weights = self.weights[1:] / self.weights[1:].sum()
     
-    async def assess_prompt_quality(self, prompt: str) -> Dict[str, float]:
+    async def assess_prompt_quality(self, prompt: str, full: bool = False) -> Dict[str, Any]:
         """
-        Assess the quality of a prompt across multiple dimensions
+        Assess the quality of a prompt across multiple dimensions.
+
+        The rule-based score comes first; the AI judge (QUALITY_JUDGE_MODEL) is
+        only asked when that score falls inside QUALITY_UNCERTAINTY_BAND, or
+        when `full` is requested.
         """
+        clarity_score, specificity_score, structure_score = self._rule_components(prompt)
+        
+        scores = {
+            "clarity": round(clarity_score, 2),
+            "specificity": round(specificity_score, 2),
+            "structure": round(structure_score, 2)
+        }
+        rule_score = float(self._calculate_rule_score(clarity_score, specificity_score, structure_score))
+        
+        low, high = settings.QUALITY_UNCERTAINTY_BAND
+        if not full and not low <= rule_score <= high:
+            # Conclusive without a judgement
+            self._count_judgement(JUDGE_SKIPPED)
+            return {"overall": round(rule_score, 2), **scores, "judge": JUDGE_SKIPPED}
+        
         try:
             # Get AI-based quality assessment
-            ai_analysis = await self.ai_service.analyze_text(prompt, "quality")
-            
-            # Get rule-based assessments
-            clarity_score = self._assess_clarity(prompt)
-            specificity_score = self._assess_specificity(prompt)
-            structure_score = self._assess_structure(prompt)
+            ai_analysis = await self.ai_service.analyze_text(prompt, "quality", model=settings.QUALITY_JUDGE_MODEL)
+            if "error" in ai_analysis:
+                raise ValueError(ai_analysis["error"])
+            ai_score = float(ai_analysis["overall"])
             
             # Combine AI and rule-based scores
             overall_score = self._calculate_overall_score(
-                ai_analysis.get('overall', 5.0),
+                ai_score,
                 clarity_score,
                 specificity_score,
                 structure_score
             )
             
+            self._count_judgement(JUDGE_CALLED)
             return {
-                "overall": round(overall_score, 2),
-                "clarity": round(clarity_score, 2),
-                "specificity": round(specificity_score, 2),
-                "structure": round(structure_score, 2),
-                "ai_assessment": ai_analysis
+                "overall": round(float(overall_score), 2),
+                **scores,
+                "ai": ai_score,
+                "ai_assessment": ai_analysis,
+                "judge": JUDGE_CALLED
             }
         
         except Exception as e:
             # Fallback to rule-based assessment only
-            clarity_score = self._assess_clarity(prompt)
-            specificity_score = self._assess_specificity(prompt)
-            structure_score = self._assess_structure(prompt)
-            overall_score = self._calculate_overall_score(5.0, clarity_score, specificity_score, structure_score)
-            
-            return {
-                "overall": round(overall_score, 2),
-                "clarity": round(clarity_score, 2),
-                "specificity": round(specificity_score, 2),
-                "structure": round(structure_score, 2),
-                "error": str(e)
-            }
+            self._count_judgement(JUDGE_FAILED)
+            return {"overall": round(rule_score, 2), **scores, "judge": JUDGE_FAILED, "error": str(e)}
+    
+    def rule_score(self, prompt: str) -> float:
+        """
+        Overall score from the rule-based components alone, without calling the judge
+        """
+        return round(float(self._calculate_rule_score(*self._rule_components(prompt))), 2)
     
-    def _assess_clarity(self, prompt: str) -> float:
+    @staticmethod
+    def rule_threshold(threshold: float) -> float:
+        """
+        Map a 1-10 quality threshold onto the span rule-only scores actually reach (RULE_SCORE_RANGE)
+        """
+        low, high = settings.RULE_SCORE_RANGE
+        return round(low + (min(max(threshold, 1.0), 10.0) - 1.0) / 9.0 * (high - low), 2)
+    
+    def _rule_components(self, prompt: str) -> Tuple[float, float, float]:
+        columns = PromptFeatures(*feature_matrix([prompt]).T)
+        return (
+            float(self._assess_clarity(columns)[0]),
+            float(self._assess_specificity(columns)[0]),
+            float(self._assess_structure(columns)[0])
+        )
+    
+    def _count_judgement(self, outcome: str):
+        """
+        Count judge outcomes per day, for how often the AI judge is skipped
+        """
+        key = JUDGE_COUNTER_KEY.format(date=datetime.utcnow().date().isoformat())
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(key, outcome, 1)
+            pipe.expire(key, JUDGE_COUNTER_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to count quality judgement", outcome=outcome, error=str(e))
+    
+    def get_judge_counts(self, day: Optional[date_type] = None) -> Dict[str, int]:
+        """
+        Judge outcomes for a day (today by default)
+        """
+        day = day or datetime.utcnow().date()
+        raw = self.redis.hgetall(JUDGE_COUNTER_KEY.format(date=day.isoformat()))
+        return {outcome: int(raw.get(outcome, 0)) for outcome in (JUDGE_SKIPPED, JUDGE_CALLED, JUDGE_FAILED)}
+    
+    def score_batch(self, prompts: Sequence[str], ai_scores: Optional[Sequence[Optional[float]]] = None) -> Dict[str, np.ndarray]:
+        """
+        Rule-based scores for many prompts at once.
+
+        `ai_scores` supplies previously recorded AI scores (None entries, or
+        no list at all, use NEUTRAL_AI_SCORE). Returns arrays aligned with
+        `prompts` for overall, clarity, specificity and structure.
+        """
+        columns = PromptFeatures(*feature_matrix(prompts).T)
+        clarity = self._assess_clarity(columns)
+        specificity = self._assess_specificity(columns)
+        structure = self._assess_structure(columns)
+        
+        if ai_scores is None:
+            ai = np.full(len(prompts), NEUTRAL_AI_SCORE)
+        else:
+            ai = np.array([NEUTRAL_AI_SCORE if score is None else score for score in ai_scores], dtype=float)
+        
+        return {
+            "overall": self._calculate_overall_score(ai, clarity, specificity, structure),
+            "clarity": clarity,
+            "specificity": specificity,
+            "structure": structure
+        }
+    
+    def _assess_clarity(self, features: PromptFeatures) -> np.ndarray:
         """
         Assess prompt clarity using rule-based metrics
         """
-        score = 5.0  # Base score
+        score = np.full(len(features.word_count), 5.0)  # Base score
         
         # Length assessment
-        word_count = len(prompt.split())
-        if 10 <= word_count <= 100:
-            score += 1.0
-        elif word_count < 10:
-            score -= 1.0
-        elif word_count > 200:
-            score -= 0.5
+        words = features.word_count
+        score += np.select([(words >= 10) & (words <= 100), words < 10, words > 200], [1.0, -1.0, -0.5], 0.0)
         
         # Sentence structure
-        sentences = re.split(r'[.!?]+', prompt)
-        avg_sentence_length = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0
-        
-        if 5 <= avg_sentence_length <= 20:
-            score += 0.5
-        elif avg_sentence_length > 30:
-            score -= 0.5
-        
-        # Clarity indicators
-        clarity_indicators = ['clearly', 'specifically', 'precisely', 'exactly', 'in detail']
-        clarity_count = sum(1 for indicator in clarity_indicators if indicator in prompt.lower())
-        score += min(clarity_count * 0.3, 1.0)
+        sentence_length = features.avg_sentence_length
+        score += np.select([(sentence_length >= 5) & (sentence_length <= 20), sentence_length > 30], [0.5, -0.5], 0.0)
         
-        # Ambiguity indicators
-        ambiguity_indicators = ['maybe', 'perhaps', 'possibly', 'might', 'could', 'somehow']
-        ambiguity_count = sum(1 for indicator in ambiguity_indicators if indicator in prompt.lower())
-        score -= min(ambiguity_count * 0.2, 1.0)
+        # Clarity and ambiguity indicators
+        score += np.minimum(features.clarity_terms * 0.3, 1.0)
+        score -= np.minimum(features.ambiguity_terms * 0.2, 1.0)
         
-        return max(1.0, min(10.0, score))
+        return np.clip(score, 1.0, 10.0)
     
-    def _assess_specificity(self, prompt: str) -> float:
+    def _assess_specificity(self, features: PromptFeatures) -> np.ndarray:
         """
         Assess prompt specificity using rule-based metrics
         """
-        score = 5.0  # Base score
-        
-        # Specific details
-        specific_indicators = ['numbers', 'dates', 'names', 'locations', 'quantities']
-        specificity_count = 0
-        
-        # Check for numbers
-        if re.search(r'\d+', prompt):
-            specificity_count += 1
+        score = np.full(len(features.word_count), 5.0)  # Base score
         
-        # Check for dates
-        if re.search(r'\d{4}|\d{1,2}/\d{1,2}|\d{1,2}-\d{1,2}', prompt):
-            specificity_count += 1
-        
-        # Check for proper nouns (capitalized words)
-        proper_nouns = len(re.findall(r'\b[A-Z][a-z]+\b', prompt))
-        if proper_nouns > 0:
-            specificity_count += 1
-        
-        # Check for specific quantities
-        quantity_indicators = ['exactly', 'precisely', 'specifically', 'in particular']
-        if any(indicator in prompt.lower() for indicator in quantity_indicators):
-            specificity_count += 1
-        
-        score += min(specificity_count * 0.5, 2.0)
+        # Numbers, dates, proper nouns and specific quantities
+        specificity_count = (
+            features.has_numbers +
+            features.has_dates +
+            (features.proper_noun_count > 0) +
+            (features.quantity_terms > 0)
+        )
+        score += np.minimum(specificity_count * 0.5, 2.0)
         
         # Vague terms penalty
-        vague_terms = ['thing', 'stuff', 'something', 'anything', 'everything', 'nothing']
-        vague_count = sum(1 for term in vague_terms if term in prompt.lower())
-        score -= min(vague_count * 0.3, 1.5)
+        score -= np.minimum(features.vague_terms * 0.3, 1.5)
         
-        return max(1.0, min(10.0, score))
+        return np.clip(score, 1.0, 10.0)
     
-    def _assess_structure(self, prompt: str) -> float:
+    def _assess_structure(self, features: PromptFeatures) -> np.ndarray:
         """
         Assess prompt structure and organization
         """
-        score = 5.0  # Base score
+        score = np.full(len(features.word_count), 5.0)  # Base score
         
         # Paragraph structure
-        paragraphs = prompt.split('\n\n')
-        if 1 <= len(paragraphs) <= 3:
-            score += 0.5
+        score += 0.5 * ((features.paragraph_count >= 1) & (features.paragraph_count <= 3))
         
         # Bullet points or numbered lists
-        if re.search(r'^\s*[-*•]\s|^\s*\d+\.', prompt, re.MULTILINE):
-            score += 0.5
+        score += 0.5 * features.has_lists
         
         # Logical connectors
-        connectors = ['because', 'therefore', 'however', 'although', 'furthermore', 'additionally']
-        connector_count = sum(1 for connector in connectors if connector in prompt.lower())
-        score += min(connector_count * 0.2, 1.0)
+        score += np.minimum(features.connector_terms * 0.2, 1.0)
         
         # Question structure
-        if '?' in prompt:
-            score += 0.3
+        score += 0.3 * features.has_questions
         
         # Action-oriented language
-        action_verbs = ['create', 'generate', 'write', 'analyze', 'explain', 'describe', 'compare']
-        action_count = sum(1 for verb in action_verbs if verb in prompt.lower())
-        score += min(action_count * 0.2, 1.0)
+        score += np.minimum(features.action_terms * 0.2, 1.0)
         
-        return max(1.0, min(10.0, score))
+        return np.clip(score, 1.0, 10.0)
     
-    def _calculate_overall_score(self, ai_score: float, clarity: float, specificity: float, structure: float) -> float:
+    def _calculate_overall_score(self, ai_score, clarity, specificity, structure):
         """
-        Calculate overall quality score
+        Calculate overall quality score as the weighted sum of its components
         """
-        # Weighted average: AI assessment gets higher weight
-        weights = {
-            'ai': 0.4,
-            'clarity': 0.25,
-            'specificity': 0.2,
-            'structure': 0.15
-        }
-        
-        overall = (
-            ai_score * weights['ai'] +
-            clarity * weights['clarity'] +
-            specificity * weights['specificity'] +
-            structure * weights['structure']
-        )
-        
-        return max(1.0, min(10.0, overall))
+        components = np.stack(np.broadcast_arrays(ai_score, clarity, specificity, structure), axis=-1)
+        return np.clip(components @ self.weights, 1.0, 10.0)
+    
+    def _calculate_rule_score(self, clarity, specificity, structure):
+        """
+        Calculate the rule-only score as the re-weighted sum of the rule-based components
+        """
+        components = np.stack(np.broadcast_arrays(clarity, specificity, structure), axis=-1)
+        return np.clip(components @ self.rule_weights, 1.0, 10.0)
     
     def get_quality_breakdown(self, prompt: str) -> Dict[str, Any]:
         """
         Get detailed quality breakdown
         """
+        features = analyze(prompt)
         return {
-            "word_count": len(prompt.split()),
-            "sentence_count": len(re.split(r'[.!?]+', prompt)),
-            "avg_sentence_length": len(prompt.split()) / len(re.split(r'[.!?]+', prompt)) if prompt else 0,
-            "paragraph_count": len(prompt.split('\n\n')),
-            "has_numbers": bool(re.search(r'\d+', prompt)),
-            "has_dates": bool(re.search(r'\d{4}|\d{1,2}/\d{1,2}|\d{1,2}-\d{1,2}', prompt)),
-            "has_proper_nouns": len(re.findall(r'\b[A-Z][a-z]+\b', prompt)),
-            "has_questions": '?' in prompt,
-            "has_lists": bool(re.search(r'^\s*[-*•]\s|^\s*\d+\.', prompt, re.MULTILINE))
-        } 
\ No newline at end of file
+            "word_count": features.word_count,
+            "sentence_count": features.sentence_count,
+            "avg_sentence_length": features.avg_sentence_length,
+            "paragraph_count": features.paragraph_count,
+            "has_numbers": features.has_numbers,
+            "has_dates": features.has_dates,
+            "has_proper_nouns": features.proper_noun_count,
+            "has_questions": features.has_questions,
+            "has_lists": features.has_lists
+        }
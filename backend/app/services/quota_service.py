@@ -0,0 +1,321 @@
+from typing import Any, Dict, List
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+import structlog
+from app.core.config import settings
+from app.core.database import ASYNC_SESSION, after_async_commit, async_redis_client, redis_client
+from app.models.user import SubscriptionTier, User
+
+logger = structlog.get_logger()
+
+QUOTA_KEY = "quota:{user_id}"
+RESERVATIONS_KEY = "quota:{user_id}:reservations"  # Sorted set of reservation ids by expiry (ms)
+DIRTY_KEY = "quota:dirty"  # Set of user ids whose usage awaits write-back
+
+FLUSH_BATCH_SIZE = 500
+
+LIMIT_FIELDS = ("monthly_optimizations", "monthly_tokens", "subscription_tier")
+
+# Shared prelude. KEYS: quota hash, reservations, dirty set. ARGV[1..6] seed
+# the hash from the users row when it is not cached (monthly_optimizations,
+# monthly_tokens, unlimited, optimizations_used, tokens_used) and give its TTL.
+# Reservations past their expiry are handed back before anything else; the
+# reservations set shares the hash's TTL so it outlives every reservation in it.
+_PRELUDE = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1],
+        'monthly_optimizations', ARGV[1], 'monthly_tokens', ARGV[2], 'unlimited', ARGV[3],
+        'optimizations_used', ARGV[4], 'tokens_used', ARGV[5],
+        'optimizations_reserved', 0, 'tokens_reserved', 0)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+
+local function release(id)
+    redis.call('ZREM', KEYS[2], id)
+    local tokens = redis.call('HGET', KEYS[1], 'r:' .. id)
+    if not tokens then
+        return
+    end
+    redis.call('HINCRBY', KEYS[1], 'optimizations_reserved', -1)
+    redis.call('HINCRBY', KEYS[1], 'tokens_reserved', -tonumber(tokens))
+    redis.call('HDEL', KEYS[1], 'r:' .. id)
+end
+
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    release(id)
+end
+
+local function field(name)
+    return tonumber(redis.call('HGET', KEYS[1], name)) or 0
+end
+"""
+
+# ARGV[7] reservation id, ARGV[8] estimated tokens, ARGV[9] reservation TTL (ms).
+# Returns 1 when reserved, 0 when it would exceed a limit.
+RESERVE_SCRIPT = _PRELUDE + """
+local tokens = tonumber(ARGV[8])
+if field('unlimited') == 0 then
+    if field('optimizations_used') + field('optimizations_reserved') + 1 > field('monthly_optimizations') then
+        return 0
+    end
+    if field('tokens_used') + field('tokens_reserved') + tokens > field('monthly_tokens') then
+        return 0
+    end
+end
+
+redis.call('HINCRBY', KEYS[1], 'optimizations_reserved', 1)
+redis.call('HINCRBY', KEYS[1], 'tokens_reserved', tokens)
+redis.call('HSET', KEYS[1], 'r:' .. ARGV[7], tokens)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[9]), ARGV[7])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return 1
+"""
+
+# ARGV[7] reservation id, ARGV[8] actual tokens. Usage is recorded even when
+# the reservation has already expired, since the work was done.
+COMMIT_SCRIPT = _PRELUDE + """
+release(ARGV[7])
+redis.call('HINCRBY', KEYS[1], 'optimizations_used', 1)
+redis.call('HINCRBY', KEYS[1], 'tokens_used', ARGV[8])
+redis.call('SADD', KEYS[3], ARGV[9])
+return 1
+"""
+
+# ARGV[7] reservation id
+RELEASE_SCRIPT = _PRELUDE + """
+release(ARGV[7])
+return 1
+"""
+
+# Returns used, reserved and limit values in USAGE_FIELDS order
+USAGE_SCRIPT = _PRELUDE + """
+return redis.call('HMGET', KEYS[1],
+    'monthly_optimizations', 'monthly_tokens', 'unlimited',
+    'optimizations_used', 'tokens_used', 'optimizations_reserved', 'tokens_reserved')
+"""
+
+USAGE_FIELDS = (
+    "monthly_optimizations", "monthly_tokens", "unlimited",
+    "optimizations_used", "tokens_used", "optimizations_reserved", "tokens_reserved"
+)
+
+# Updates limits of a cached hash; ARGV: monthly_optimizations, monthly_tokens, unlimited
+SET_LIMITS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'monthly_optimizations', ARGV[1], 'monthly_tokens', ARGV[2], 'unlimited', ARGV[3])
+end
+return 1
+"""
+
+# Zeroes cached usage and marks the user dirty, so the next flush writes the
+# zeros even if a flush already holding the old usage commits after the reset;
+# ARGV[1] user id
+RESET_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'optimizations_used', 0, 'tokens_used', 0)
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+
+def _limits(user: User) -> List[Any]:
+    return [
+        user.monthly_optimizations or 0,
+        user.monthly_tokens or 0,
+        int(user.subscription_tier == SubscriptionTier.ENTERPRISE),
+    ]
+
+
+class QuotaService:
+    """
+    Monthly usage quotas kept in Redis.
+
+    Each user's limits and usage live in one hash, seeded from the users row
+    on first use. Submissions atomically reserve their estimated tokens, so
+    parallel requests cannot overshoot a limit, and completed tasks replace the
+    reservation with the tokens actually used. Reservations of tasks that never
+    finish expire after QUOTA_RESERVATION_TTL. Usage is written back to the
+    users table by a periodic batched flush.
+    """
+
+    def __init__(self, redis=None, async_redis=None):
+        self.redis = redis or redis_client
+        self.async_redis = async_redis or async_redis_client
+        self._scripts = {}
+
+    def _script(self, client, source: str):
+        key = (id(client), source)
+        if key not in self._scripts:
+            self._scripts[key] = client.register_script(source)
+        return self._scripts[key]
+
+    @staticmethod
+    def _keys(user_id: int) -> List[str]:
+        return [QUOTA_KEY.format(user_id=user_id), RESERVATIONS_KEY.format(user_id=user_id), DIRTY_KEY]
+
+    @staticmethod
+    def _seed(user: User) -> List[Any]:
+        return _limits(user) + [user.optimizations_used or 0, user.tokens_used or 0, settings.QUOTA_CACHE_TTL]
+
+    async def reserve(self, user: User, reservation_id: str, estimated_tokens: int) -> bool:
+        """
+        Reserve one optimization and `estimated_tokens` tokens, or return False if over quota
+        """
+        allowed = await self._script(self.async_redis, RESERVE_SCRIPT)(
+            keys=self._keys(user.id),
+            args=self._seed(user) + [reservation_id, int(estimated_tokens), settings.QUOTA_RESERVATION_TTL * 1000]
+        )
+        return bool(allowed)
+
+    async def release(self, user: User, reservation_id: str):
+        """
+        Hand back a reservation whose optimization was never started
+        """
+        await self._script(self.async_redis, RELEASE_SCRIPT)(
+            keys=self._keys(user.id),
+            args=self._seed(user) + [reservation_id]
+        )
+
+    async def usage(self, user: User) -> Dict[str, int]:
+        """
+        Current limits, usage and outstanding reservations for a user
+        """
+        values = await self._script(self.async_redis, USAGE_SCRIPT)(
+            keys=self._keys(user.id),
+            args=self._seed(user)
+        )
+        return {field: int(value or 0) for field, value in zip(USAGE_FIELDS, values)}
+
+    async def can_optimize(self, user: User) -> bool:
+        """
+        Whether the user has an optimization left, counting outstanding reservations
+        """
+        usage = await self.usage(user)
+        return bool(usage["unlimited"]) or (
+            usage["optimizations_used"] + usage["optimizations_reserved"] < usage["monthly_optimizations"]
+        )
+
+    async def reset(self, user_id: int):
+        """
+        Zero cached usage.
+
+        Call this before committing the zeroed users row: a flush between the
+        commit and the reset would write the old cached usage back over it.
+        """
+        keys = self._keys(user_id)
+        await self._script(self.async_redis, RESET_SCRIPT)(keys=[keys[0], keys[2]], args=[user_id])
+
+    def commit_sync(self, user: User, reservation_id: str, tokens_used: int):
+        """
+        Record a completed optimization, replacing its reservation with actual usage
+        """
+        self._script(self.redis, COMMIT_SCRIPT)(
+            keys=self._keys(user.id),
+            args=self._seed(user) + [reservation_id or "", int(tokens_used), user.id]
+        )
+
+    def release_sync(self, user: User, reservation_id: str):
+        """
+        Hand back the reservation of a failed optimization
+        """
+        self._script(self.redis, RELEASE_SCRIPT)(
+            keys=self._keys(user.id),
+            args=self._seed(user) + [reservation_id]
+        )
+
+    async def set_limits(self, user_id: int, limits: List[Any]):
+        """
+        Apply changed limits or tier to a cached quota
+        """
+        await self._script(self.async_redis, SET_LIMITS_SCRIPT)(keys=[QUOTA_KEY.format(user_id=user_id)], args=limits)
+
+    def set_limits_sync(self, user_id: int, limits: List[Any]):
+        """
+        Apply changed limits or tier to a cached quota
+        """
+        self._script(self.redis, SET_LIMITS_SCRIPT)(keys=[QUOTA_KEY.format(user_id=user_id)], args=limits)
+
+    def flush(self, db: Session) -> int:
+        """
+        Write cached usage of every dirty user back to the users table
+        """
+        flushed = 0
+
+        while True:
+            members = self.redis.spop(DIRTY_KEY, FLUSH_BATCH_SIZE)
+            if not members:
+                return flushed
+
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in members:
+                pipe.hmget(QUOTA_KEY.format(user_id=user_id), "optimizations_used", "tokens_used")
+            snapshots = pipe.execute()
+
+            rows = [
+                {"id": int(user_id), "optimizations_used": int(optimizations_used), "tokens_used": int(tokens_used)}
+                for user_id, (optimizations_used, tokens_used) in zip(members, snapshots)
+                if optimizations_used is not None and tokens_used is not None
+            ]
+            if not rows:
+                continue
+
+            try:
+                db.execute(update(User), rows)
+                db.commit()
+            except Exception:
+                # Put the batch back so the next flush retries it
+                db.rollback()
+                self.redis.sadd(DIRTY_KEY, *members)
+                raise
+
+            flushed += len(rows)
+
+
+quota_service = QuotaService()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_limits(session, flush_context):
+    changed = session.info.setdefault("quota_limit_users", {})
+    for instance in session.dirty:
+        if not isinstance(instance, User):
+            continue
+        state = inspect(instance)
+        if any(state.attrs[field].history.has_changes() for field in LIMIT_FIELDS):
+            changed[instance.id] = _limits(instance)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changed_limits(session):
+    if session.info.get(ASYNC_SESSION):
+        return  # Left for _apply_changed_limits_async
+    changed = session.info.pop("quota_limit_users", None)
+    if not changed:
+        return
+    for user_id, limits in changed.items():
+        try:
+            quota_service.set_limits_sync(user_id, limits)
+        except Exception as e:
+            logger.warning("Failed to update cached quota limits", user_id=user_id, error=str(e))
+
+
+@after_async_commit
+async def _apply_changed_limits_async(info):
+    changed = info.pop("quota_limit_users", None)
+    if not changed:
+        return
+    for user_id, limits in changed.items():
+        try:
+            await quota_service.set_limits(user_id, limits)
+        except Exception as e:
+            logger.warning("Failed to update cached quota limits", user_id=user_id, error=str(e))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_limits(session, previous_transaction):
+    session.info.pop("quota_limit_users", None)
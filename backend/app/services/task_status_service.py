@@ -0,0 +1,198 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from app.core.config import settings
+from app.core.database import redis_client, async_redis_client
+
+TASK_STATUS_KEY = "task_status:{task_id}"
+TASK_EVENTS_CHANNEL = "task_events:{task_id}"
+TASK_EVENTS_PATTERN = "task_events:*"
+
+TERMINAL_STATES = {"SUCCESS", "FAILURE"}
+
+
+class TaskEventHub:
+    """
+    Fans out task events from a single Redis pattern subscription to local waiters.
+
+    One subscription per process keeps Redis connection count flat no matter how
+    many clients are long-polling or streaming.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis or async_redis_client
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._listener: Optional[asyncio.Task] = None
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(TASK_EVENTS_PATTERN)
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    event = json.loads(message["data"])
+                    for queue in list(self._subscribers.get(event.get("task_id"), ())):
+                        queue.put_nowait(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Reconnect after transient Redis errors
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Register a queue that receives every event published for task_id"""
+        self._ensure_listener()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[task_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[task_id].discard(queue)
+            if not self._subscribers[task_id]:
+                del self._subscribers[task_id]
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+task_event_hub = TaskEventHub()
+
+
+class TaskStatusService:
+    """
+    Stores and publishes Celery task state transitions in Redis so that status
+    reads never touch the Celery result backend.
+    """
+
+    def __init__(self, redis=None, async_redis=None, hub: TaskEventHub = None):
+        self.redis = redis or redis_client
+        self.async_redis = async_redis or async_redis_client
+        self.hub = hub or task_event_hub
+
+    def publish(self, task_id: str, state: str, user_id: Optional[int] = None, **meta) -> Dict[str, Any]:
+        """
+        Record the latest state of a task and notify subscribers
+        """
+        event = {
+            "task_id": task_id,
+            "state": state,
+            "user_id": user_id,
+            "timestamp": time.time(),
+            **meta
+        }
+        payload = json.dumps(event, default=str)
+
+        pipe = self.redis.pipeline()
+        pipe.set(TASK_STATUS_KEY.format(task_id=task_id), payload, ex=settings.TASK_STATUS_TTL)
+        pipe.publish(TASK_EVENTS_CHANNEL.format(task_id=task_id), payload)
+        pipe.execute()
+
+        return event
+
+    async def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the last published event for a task
+        """
+        payload = await self.async_redis.get(TASK_STATUS_KEY.format(task_id=task_id))
+        return json.loads(payload) if payload else None
+
+    async def wait_for_change(
+        self,
+        task_id: str,
+        since_state: Optional[str] = None,
+        timeout: float = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Block until the task leaves since_state (or reaches a terminal state) or
+        the timeout expires, then return the latest event
+        """
+        async with self.hub.subscribe(task_id) as queue:
+            # Read after subscribing so a transition in between is not missed
+            event = await self.get_status(task_id)
+            if event is None or timeout <= 0 or self._has_changed(event, since_state):
+                return event
+
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return event
+                try:
+                    event = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return event
+                if self._has_changed(event, since_state):
+                    return event
+
+    async def stream(self, task_id: str, timeout: float = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the current event followed by every transition until the task
+        finishes or the timeout expires
+        """
+        timeout = timeout or settings.TASK_STATUS_STREAM_TIMEOUT
+        deadline = time.monotonic() + timeout
+
+        async with self.hub.subscribe(task_id) as queue:
+            event = await self.get_status(task_id)
+            if event is not None:
+                yield event
+                if event["state"] in TERMINAL_STATES:
+                    return
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return
+                yield event
+                if event["state"] in TERMINAL_STATES:
+                    return
+
+    @staticmethod
+    def _has_changed(event: Dict[str, Any], since_state: Optional[str]) -> bool:
+        if since_state is None:
+            return event["state"] in TERMINAL_STATES
+        return to_api_status(event["state"]) != since_state
+
+    @staticmethod
+    def to_response(event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a stored event into the public task status payload
+        """
+        status = to_api_status(event["state"])
+        response = {"status": status, "task_id": event["task_id"]}
+
+        if status == "completed":
+            response["result"] = event.get("result")
+        elif status == "failed":
+            response["error"] = event.get("error")
+        elif event.get("status"):
+            response["message"] = event["status"]
+
+        return response
+
+
+def to_api_status(state: str) -> str:
+    """Map a Celery state onto the status values exposed by the API"""
+    if state == "SUCCESS":
+        return "completed"
+    if state == "FAILURE":
+        return "failed"
+    return "processing"
@@ -1,5 +1,5 @@
 import tiktoken
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
 from app.core.config import settings
 
 
@@ -36,6 +36,12 @@ class TokenService:
             words = text.split()
             return len(words) * 1.3  # Rough approximation
     
+    def token_costs(self, phrases: Iterable[str], model: str = "gpt-4") -> Dict[str, int]:
+        """
+        Token cost of each phrase as it appears mid-text, after a space
+        """
+        return {phrase: self.count_tokens(f" {phrase}", model) if phrase else 0 for phrase in phrases}
+    
     def calculate_cost(self, token_count: int, model: str = "gpt-4") -> float:
         """
         Calculate cost for token count and model
@@ -57,6 +63,13 @@ class TokenService:
         
         return input_cost + output_cost
     
+    def calculate_call_cost(self, input_tokens: int, output_tokens: int, model: str = "gpt-4") -> float:
+        """
+        Calculate cost of a call with known input and output token counts
+        """
+        pricing = self.model_pricing.get(model) or self.model_pricing["gpt-4"]
+        return (input_tokens / 1000) * pricing.get("input", 0.03) + (output_tokens / 1000) * pricing.get("output", 0.06)
+    
     def estimate_cost_savings(self, original_tokens: int, optimized_tokens: int, model: str = "gpt-4") -> Dict[str, Any]:
         """
         Estimate cost savings from token reduction
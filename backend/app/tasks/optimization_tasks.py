@@ -1,10 +1,74 @@
+import structlog
+from datetime import datetime
 from celery import current_task
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.core.database import SessionLocal
-from app.services.optimization_service import OptimizationService
+from app.core.services import get_services
+from app.services.analytics_rollup_service import AnalyticsRollupService
+from app.services.quota_service import quota_service
+from app.services.task_status_service import TaskStatusService
 from app.models.user import User
-from app.models.prompt import OptimizationType
+from app.models.prompt import OptimizationType, Prompt
+from app.models.prompt_blob import PromptBlob, decode_content
+
+
+logger = structlog.get_logger()
+
+task_status_service = TaskStatusService()
+analytics_rollup_service = AnalyticsRollupService()
+
+
+def _update_state(state: str, user_id: int, **meta):
+    """Update Celery state and push the transition to status subscribers"""
+    current_task.update_state(state=state, meta=meta)
+    task_status_service.publish(current_task.request.id, state, user_id=user_id, **meta)
+
+
+def _release_reservation(user_id: int, reservation_id: str):
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        if user:
+            quota_service.release_sync(user, reservation_id)
+    except Exception as e:
+        # The reservation still expires after QUOTA_RESERVATION_TTL
+        logger.warning("Failed to release quota reservation", user_id=user_id, error=str(e))
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True)
+def flush_usage_quotas_task(self):
+    """
+    Write cached quota usage back to the users table
+    """
+    try:
+        # Get database session
+        db = SessionLocal()
+        
+        try:
+            flushed = quota_service.flush(db)
+            
+            return {
+                "status": "Usage quotas flushed successfully",
+                "users_flushed": flushed
+            }
+            
+        finally:
+            db.close()
+    
+    except Exception as e:
+        current_task.update_state(
+            state='FAILURE',
+            meta={
+                'status': 'Usage quota flush failed',
+                'error': str(e)
+            }
+        )
+        raise
 
 
 @celery_app.task(bind=True)
@@ -15,56 +79,70 @@ def optimize_prompt_task(
     optimization_type: str,
     target_model: str = None,
     reduction_target: float = None,
-    quality_threshold: float = None
+    quality_threshold: float = None,
+    candidates: int = 1,
+    candidate_models: list = None,
+    reservation_id: str = None
 ):
     """
     Background task for prompt optimization
     """
     try:
         # Update task status
-        current_task.update_state(
-            state='PROGRESS',
-            meta={'status': 'Starting optimization...'}
-        )
+        _update_state('PROGRESS', user_id, status='Starting optimization...')
         
         # Get database session
         db = SessionLocal()
         
         try:
-            # Initialize optimization service
-            optimization_service = OptimizationService()
+            services = get_services()
             
             # Update task status
-            current_task.update_state(
-                state='PROGRESS',
-                meta={'status': 'Processing optimization...'}
-            )
+            _update_state('PROGRESS', user_id, status='Processing optimization...')
             
             # Perform optimization
-            result = optimization_service.optimize_prompt(
+            result = services.run(services.optimization_service.optimize_prompt(
                 prompt_id=prompt_id,
                 user_id=user_id,
                 optimization_type=OptimizationType(optimization_type),
                 target_model=target_model,
                 reduction_target=reduction_target,
                 quality_threshold=quality_threshold,
+                candidates=candidates,
+                candidate_models=candidate_models,
                 db=db
-            )
+            ))
             
-            # Update user usage
-            user = db.query(User).filter(User.id == user_id).first()
+            # Replace the quota reservation with actual usage
+            user = db.get(User, user_id)
             if user:
-                tokens_used = result.get('original_tokens', 0) + result.get('optimized_tokens', 0)
-                user.record_optimization(tokens_used)
+                # Every candidate counts, including ones cancelled or failed after the prompt was sent
+                tokens_used = result['optimization_settings'].get(
+                    'tokens_spent',
+                    result.get('original_tokens', 0) + result.get('optimized_tokens', 0)
+                )
+                quota_service.commit_sync(user, reservation_id, tokens_used)
+            
+            # Update analytics rollups
+            try:
+                analytics_rollup_service.record_optimization(
+                    db,
+                    user_id,
+                    result,
+                    created_at=datetime.fromisoformat(result['created_at']) if result.get('created_at') else None
+                )
                 db.commit()
+            except Exception as e:
+                # Rollups are rebuilt nightly from optimizations
+                db.rollback()
+                logger.warning("Analytics rollup update failed", user_id=user_id, error=str(e))
             
             # Update task status
-            current_task.update_state(
-                state='SUCCESS',
-                meta={
-                    'status': 'Optimization completed successfully',
-                    'result': result
-                }
+            _update_state(
+                'SUCCESS',
+                user_id,
+                status='Optimization completed successfully',
+                result=result
             )
             
             return result
@@ -73,13 +151,16 @@ def optimize_prompt_task(
             db.close()
     
     except Exception as e:
+        # Nothing was used; hand the reservation back
+        if reservation_id:
+            _release_reservation(user_id, reservation_id)
+        
         # Update task status with error
-        current_task.update_state(
-            state='FAILURE',
-            meta={
-                'status': 'Optimization failed',
-                'error': str(e)
-            }
+        _update_state(
+            'FAILURE',
+            user_id,
+            status='Optimization failed',
+            error=str(e)
         )
         raise
 
@@ -146,14 +227,11 @@ def batch_optimize_prompts_task(
 
 
 @celery_app.task(bind=True)
-def analyze_prompt_quality_task(self, prompt_id: int, user_id: int):
+def analyze_prompt_quality_task(self, prompt_id: int, user_id: int, full: bool = False):
     """
     Background task for prompt quality analysis
     """
     try:
-        from app.services.quality_service import QualityService
-        from app.models.prompt import Prompt
-        
         # Get database session
         db = SessionLocal()
         
@@ -168,13 +246,14 @@ def analyze_prompt_quality_task(self, prompt_id: int, user_id: int):
                 raise ValueError("Prompt not found")
             
             # Analyze quality
-            quality_service = QualityService()
-            quality_scores = quality_service.assess_prompt_quality(prompt.original_prompt)
+            services = get_services()
+            quality_scores = services.run(services.quality_service.assess_prompt_quality(prompt.original_prompt, full=full))
             
             # Update prompt with quality scores
             prompt.clarity_score = quality_scores.get('clarity', 0)
             prompt.specificity_score = quality_scores.get('specificity', 0)
             prompt.overall_quality_score = quality_scores.get('overall', 0)
+            prompt.ai_quality_score = quality_scores.get('ai')
             
             db.commit()
             
@@ -194,4 +273,80 @@ def analyze_prompt_quality_task(self, prompt_id: int, user_id: int):
                 'error': str(e)
             }
         )
-        raise 
\ No newline at end of file
+        raise 
+
+
+@celery_app.task(bind=True)
+def rescore_prompt_library_task(self, user_id: int, chunk_size: int = None):
+    """
+    Re-score all of a user's prompts with the current rules and weights, one chunk at a time
+    """
+    try:
+        chunk_size = chunk_size or settings.QUALITY_RESCORE_CHUNK_SIZE
+        quality_service = get_services().quality_service
+        
+        # Get database session
+        db = SessionLocal()
+        
+        try:
+            total = db.scalar(select(func.count()).select_from(Prompt).where(Prompt.user_id == user_id))
+            rescored = 0
+            last_id = 0
+            
+            while True:
+                # Scores describe the optimized text once there is one
+                text_hash = func.coalesce(Prompt.optimized_prompt_hash, Prompt.original_prompt_hash)
+                rows = db.execute(
+                    select(Prompt.id, Prompt.ai_quality_score, PromptBlob.compression, PromptBlob.data)
+                    .join(PromptBlob, PromptBlob.hash == text_hash)
+                    .where(Prompt.user_id == user_id, Prompt.id > last_id)
+                    .order_by(Prompt.id)
+                    .limit(chunk_size)
+                ).all()
+                if not rows:
+                    break
+                
+                scores = quality_service.score_batch(
+                    [decode_content(row.compression, row.data) for row in rows],
+                    [row.ai_quality_score for row in rows]
+                )
+                db.execute(update(Prompt), [
+                    {
+                        "id": row.id,
+                        "clarity_score": round(float(clarity), 2),
+                        "specificity_score": round(float(specificity), 2),
+                        "overall_quality_score": round(float(overall), 2)
+                    }
+                    for row, clarity, specificity, overall in zip(
+                        rows, scores["clarity"], scores["specificity"], scores["overall"]
+                    )
+                ])
+                db.commit()
+                
+                rescored += len(rows)
+                last_id = rows[-1].id
+                current_task.update_state(
+                    state='PROGRESS',
+                    meta={
+                        'status': f'Re-scored {rescored}/{total} prompts',
+                        'progress': (rescored / total) * 100 if total else 100
+                    }
+                )
+            
+            return {
+                'user_id': user_id,
+                'prompts_rescored': rescored
+            }
+            
+        finally:
+            db.close()
+    
+    except Exception as e:
+        current_task.update_state(
+            state='FAILURE',
+            meta={
+                'status': 'Library re-scoring failed',
+                'error': str(e)
+            }
+        )
+        raise
@@ -0,0 +1,283 @@
+"""
+Benchmark per-user time-range queries before and after the composite indexes
+added in migration 0003_per_user_time_indexes.
+
+Seeds scratch copies of the optimizations and prompts tables (default 10M rows
+each, spread over 100k users and one year) and of the daily analytics table
+(one row per user and active day, derived from the optimizations). For each
+table it prints EXPLAIN (ANALYZE, BUFFERS) for the listing and analytics query
+shapes without the index, creates the index, and prints the plans again.
+
+    cd backend
+    python -m scripts.benchmark_indexes --rows 10000000 --users 100000 --output explain-10m.txt
+
+Everything lives in the `bench` schema and is dropped at the end unless --keep
+is passed. --output also writes the report to a file, for attaching to reviews.
+"""
+import argparse
+import re
+import sys
+import time
+
+import psycopg2
+
+from app.core.config import settings
+
+OPTIMIZATION_QUERIES = {
+    "listing_first_page": """
+        SELECT id, created_at, model_used, token_reduction, quality_score
+        FROM bench.optimizations
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+    "listing_keyset_page": """
+        SELECT id, created_at, model_used, token_reduction, quality_score
+        FROM bench.optimizations
+        WHERE user_id = %(user_id)s
+          AND (created_at, id) < (now() - interval '180 days', 2147483647)
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+    "summary_30_days": """
+        SELECT count(*), sum(token_reduction), sum(cost_savings), avg(quality_score)
+        FROM bench.optimizations
+        WHERE user_id = %(user_id)s
+          AND created_at >= now() - interval '30 days'
+    """,
+    "daily_stats_365_days": """
+        SELECT date_trunc('day', created_at), count(*), sum(token_reduction)
+        FROM bench.optimizations
+        WHERE user_id = %(user_id)s
+          AND created_at >= now() - interval '365 days'
+        GROUP BY 1
+    """,
+}
+
+PROMPT_QUERIES = {
+    "listing_first_page": """
+        SELECT id, created_at, status, category, overall_quality_score
+        FROM bench.prompts
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+    "listing_keyset_page": """
+        SELECT id, created_at, status, category, overall_quality_score
+        FROM bench.prompts
+        WHERE user_id = %(user_id)s
+          AND (created_at, id) < (now() - interval '180 days', 2147483647)
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+    "listing_by_status": """
+        SELECT id, created_at, status, category, overall_quality_score
+        FROM bench.prompts
+        WHERE user_id = %(user_id)s
+          AND status = 'completed'
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+}
+
+ANALYTICS_QUERIES = {
+    "daily_30_days": """
+        SELECT *
+        FROM bench.analytics
+        WHERE user_id = %(user_id)s
+          AND date < current_date
+          AND date >= current_date - 30
+        ORDER BY date DESC
+    """,
+    "daily_all": """
+        SELECT *
+        FROM bench.analytics
+        WHERE user_id = %(user_id)s
+          AND date < current_date
+        ORDER BY date DESC
+    """,
+    "upsert_target_lookup": """
+        SELECT id
+        FROM bench.analytics
+        WHERE user_id = %(user_id)s
+          AND date = current_date - 1
+    """,
+}
+
+# (table, index columns, index DDL, query shapes)
+BENCHMARKS = (
+    (
+        "optimizations",
+        "(user_id, created_at DESC, id DESC)",
+        "CREATE INDEX ix_bench_optimizations_user_created "
+        "ON bench.optimizations (user_id, created_at DESC, id DESC)",
+        OPTIMIZATION_QUERIES,
+    ),
+    (
+        "prompts",
+        "(user_id, created_at DESC, id DESC)",
+        "CREATE INDEX ix_bench_prompts_user_created "
+        "ON bench.prompts (user_id, created_at DESC, id DESC)",
+        PROMPT_QUERIES,
+    ),
+    (
+        "analytics",
+        "UNIQUE (user_id, date)",
+        "CREATE UNIQUE INDEX uq_bench_analytics_user_date "
+        "ON bench.analytics (user_id, date)",
+        ANALYTICS_QUERIES,
+    ),
+)
+
+
+def seed(cursor, rows: int, users: int):
+    cursor.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+    cursor.execute("CREATE SCHEMA bench")
+    cursor.execute("""
+        CREATE TABLE bench.optimizations (
+            id bigserial PRIMARY KEY,
+            user_id integer NOT NULL,
+            model_used varchar(100),
+            optimization_type varchar(50),
+            original_prompt text,
+            token_reduction integer,
+            cost_savings double precision,
+            quality_score double precision,
+            processing_time double precision,
+            created_at timestamptz NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO bench.optimizations
+            (user_id, model_used, optimization_type, original_prompt, token_reduction,
+             cost_savings, quality_score, processing_time, created_at)
+        SELECT
+            1 + (random() * (%(users)s - 1))::int,
+            (ARRAY['gpt-4', 'gpt-3.5-turbo', 'claude-3-sonnet', 'gemini-pro'])[1 + (random() * 3)::int],
+            (ARRAY['token_reduction', 'quality_enhancement', 'clarity_improvement'])[1 + (random() * 2)::int],
+            repeat(md5(g::text), 8),
+            (random() * 200)::int,
+            random() / 100,
+            1 + random() * 9,
+            random() * 10,
+            now() - random() * interval '365 days'
+        FROM generate_series(1, %(rows)s) AS g
+    """, {"rows": rows, "users": users})
+    cursor.execute("""
+        CREATE TABLE bench.prompts (
+            id bigserial PRIMARY KEY,
+            user_id integer NOT NULL,
+            title varchar(255),
+            original_prompt text,
+            status varchar(50),
+            category varchar(100),
+            overall_quality_score double precision,
+            created_at timestamptz NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO bench.prompts
+            (user_id, title, original_prompt, status, category, overall_quality_score, created_at)
+        SELECT
+            1 + (random() * (%(users)s - 1))::int,
+            'Prompt ' || g,
+            repeat(md5(g::text), 8),
+            (ARRAY['draft', 'completed', 'archived'])[1 + (random() * 2)::int],
+            (ARRAY['writing', 'coding', 'analysis', 'support'])[1 + (random() * 3)::int],
+            1 + random() * 9,
+            now() - random() * interval '365 days'
+        FROM generate_series(1, %(rows)s) AS g
+    """, {"rows": rows, "users": users})
+    cursor.execute("""
+        CREATE TABLE bench.analytics (
+            id bigserial PRIMARY KEY,
+            user_id integer NOT NULL,
+            date date NOT NULL,
+            total_optimizations integer,
+            total_tokens_saved integer,
+            total_cost_savings double precision,
+            average_quality_score double precision
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO bench.analytics
+            (user_id, date, total_optimizations, total_tokens_saved, total_cost_savings, average_quality_score)
+        SELECT user_id, created_at::date, count(*), sum(token_reduction), sum(cost_savings), avg(quality_score)
+        FROM bench.optimizations
+        GROUP BY user_id, created_at::date
+    """)
+    for table in ("optimizations", "prompts", "analytics"):
+        cursor.execute(f"ANALYZE bench.{table}")
+
+
+def explain(cursor, label: str, queries: dict, user_id: int):
+    print(f"\n=== {label} ===")
+    for name, sql in queries.items():
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, {"user_id": user_id})
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        execution = re.search(r"Execution Time: ([\d.]+) ms", plan)
+        print(f"\n--- {name} ({execution.group(1) if execution else '?'} ms) ---")
+        print(plan)
+
+
+class Tee:
+    """Write to stdout and a report file"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "w")
+        self.stdout = sys.stdout
+
+    def write(self, text: str):
+        self.stdout.write(text)
+        self.file.write(text)
+
+    def flush(self):
+        self.stdout.flush()
+        self.file.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench schema afterwards")
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.output:
+        sys.stdout = Tee(args.output)
+
+    connection = psycopg2.connect(args.dsn)
+    connection.autocommit = True
+    cursor = connection.cursor()
+
+    try:
+        started = time.time()
+        print(f"Seeding {args.rows:,} rows for {args.users:,} users...")
+        seed(cursor, args.rows, args.users)
+        print(f"Seeded in {time.time() - started:.1f}s")
+
+        for table, index, index_ddl, queries in BENCHMARKS:
+            # Pick a heavy user so the difference is representative
+            cursor.execute(
+                f"SELECT user_id FROM bench.{table} GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+            )
+            user_id = cursor.fetchone()[0]
+
+            explain(cursor, f"{table} BEFORE (primary key only)", queries, user_id)
+
+            started = time.time()
+            cursor.execute(index_ddl)
+            cursor.execute(f"ANALYZE bench.{table}")
+            print(f"\nCreated {table} index in {time.time() - started:.1f}s")
+
+            explain(cursor, f"{table} AFTER {index}", queries, user_id)
+    finally:
+        if not args.keep:
+            cursor.execute("DROP SCHEMA IF EXISTS bench CASCADE")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from app.services.chunking_service import ChunkingService
+from app.services.token_service import TokenService
+
+MODEL = "gpt-4"
+
+
+def test_oversized_paragraph_is_cut_at_sentence_ends():
+    token_service = TokenService()
+    paragraph = " ".join(f"Step {index} keeps the output under budget." for index in range(60))
+    chunks = ChunkingService(token_service).split(paragraph, MODEL, max_tokens=100)
+
+    assert len(chunks) > 1
+    assert all(token_service.count_tokens(chunk, MODEL) <= 100 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == paragraph
+
+
+def test_oversized_list_is_cut_at_line_breaks():
+    token_service = TokenService()
+    items = "\n".join(f"- Requirement {index}: validate every field before saving." for index in range(40))
+    chunks = ChunkingService(token_service).split(items, MODEL, max_tokens=100)
+
+    assert len(chunks) > 1
+    assert all(token_service.count_tokens(chunk, MODEL) <= 100 for chunk in chunks)
+    assert "\n".join(chunks) == items
+
+
+def test_fenced_code_is_never_cut():
+    code = "```python\n" + "\n".join(f"value_{index} = compute({index})" for index in range(80)) + "\n```"
+    assert ChunkingService().split(code, MODEL, max_tokens=100) == [code]
@@ -0,0 +1,77 @@
+import pytest
+from app.services.compression_service import CompressionService
+
+MODEL = "gpt-4"
+
+
+@pytest.fixture(scope="module")
+def compression_service():
+    return CompressionService()
+
+
+@pytest.mark.parametrize("prompt", [
+    "This is not very important.",
+    "Do not actually delete the files.",
+    "It isn't really required.",
+    "Never essentially rewrite the intro.",
+])
+def test_negated_intensifiers_are_kept(compression_service, prompt):
+    assert compression_service.compress(prompt, MODEL).text == prompt
+
+
+def test_filler_phrases_are_dropped(compression_service):
+    result = compression_service.compress("Please note that you should summarize the text in order to save time.", MODEL)
+    assert result.text == "You should summarize the text to save time."
+    assert result.token_delta > 0
+
+
+@pytest.mark.parametrize("prompt", [
+    "Send the summary email at the end of the day.",
+    "Always respond kindly to upset customers.",
+])
+def test_content_phrases_are_kept(compression_service, prompt):
+    assert compression_service.compress(prompt, MODEL).text == prompt
+
+
+def test_immediately_repeated_instructions_are_dropped(compression_service):
+    result = compression_service.compress("Always cite your sources. Always cite your sources. Be brief.", MODEL)
+    assert result.text == "Always cite your sources. Be brief."
+    assert result.applied["repeated_instructions"] == 1
+
+
+def test_distant_repeats_are_kept(compression_service):
+    prompt = "Always cite your sources. Be brief. Always cite your sources."
+    assert compression_service.compress(prompt, MODEL).text == prompt
+
+
+def test_few_shot_examples_are_kept(compression_service):
+    prompt = (
+        "Classify the sentiment of each review.\n\n"
+        "Example 1:\n"
+        "Input: The delivery arrived two days late.\n"
+        "Output: The customer is unhappy with shipping.\n\n"
+        "Example 2:\n"
+        "Input: The delivery arrived two days late.\n"
+        "Output: The customer is unhappy with shipping."
+    )
+    result = compression_service.compress(prompt, MODEL)
+    assert result.text == prompt
+    assert "repeated_instructions" not in result.applied
+
+
+def test_fenced_code_is_untouched(compression_service):
+    prompt = "Fix this:\n\n```python\ndef  f():   very = 1\n```"
+    assert compression_service.compress(prompt, MODEL).text == prompt
+
+
+def test_join_chunks_drops_only_exact_repeats_at_seams():
+    chunks = [
+        "Example 1:\nInput: The delivery arrived two days late.\n\nAnswer in one word.",
+        "Answer in one word.\n\nExample 2:\nInput: The delivery arrived two days late.",
+    ]
+    text, repeats = CompressionService.join_chunks(chunks)
+    assert repeats == 1
+    assert text == (
+        "Example 1:\nInput: The delivery arrived two days late.\n\nAnswer in one word.\n\n"
+        "Example 2:\nInput: The delivery arrived two days late."
+    )
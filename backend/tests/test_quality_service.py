@@ -0,0 +1,77 @@
+import pytest
+from app.core.config import settings
+from app.services.quality_service import JUDGE_CALLED, JUDGE_SKIPPED, QualityService
+
+STRONG_PROMPT = (
+    "Write a 500-word blog post explaining exactly how Python decorators work, because "
+    "beginners struggle with them. Include 3 code examples. Compare them with Java annotations.\n\n"
+    "- Use clear headings\n"
+    "- Describe each example specifically\n\n"
+    "What are common pitfalls?"
+)
+WEAK_PROMPT = "Write something about things maybe."
+UNCERTAIN_PROMPT = "Summarize the attached report in 5 bullet points."
+
+
+class FakeRedis:
+    def pipeline(self, transaction=False):
+        return self
+
+    def hincrby(self, *args):
+        pass
+
+    def expire(self, *args):
+        pass
+
+    def execute(self):
+        pass
+
+
+class FakeJudge:
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_text(self, text, analysis_type, model=None):
+        self.calls += 1
+        return {"overall": 7.0}
+
+
+@pytest.fixture
+def judge():
+    return FakeJudge()
+
+
+@pytest.fixture
+def quality_service(judge):
+    return QualityService(redis=FakeRedis(), ai_service=judge)
+
+
+def test_rule_scores_reach_both_sides_of_the_band(quality_service):
+    low, high = settings.QUALITY_UNCERTAINTY_BAND
+    assert quality_service.rule_score(WEAK_PROMPT) < low
+    assert quality_service.rule_score(STRONG_PROMPT) > high
+    assert low <= quality_service.rule_score(UNCERTAIN_PROMPT) <= high
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prompt", [WEAK_PROMPT, STRONG_PROMPT])
+async def test_conclusive_prompts_skip_the_judge(quality_service, judge, prompt):
+    scores = await quality_service.assess_prompt_quality(prompt)
+    assert scores["judge"] == JUDGE_SKIPPED
+    assert judge.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_uncertain_prompts_ask_the_judge(quality_service, judge):
+    scores = await quality_service.assess_prompt_quality(UNCERTAIN_PROMPT)
+    assert scores["judge"] == JUDGE_CALLED
+    assert scores["ai"] == 7.0
+    assert judge.calls == 1
+
+
+def test_thresholds_map_onto_reachable_rule_scores(quality_service):
+    low, high = settings.RULE_SCORE_RANGE
+    assert quality_service.rule_threshold(1.0) == low
+    assert quality_service.rule_threshold(10.0) == high
+    # The default enhancement floor is reachable by a strong prompt and not by a weak one
+    assert quality_service.rule_score(WEAK_PROMPT) < quality_service.rule_threshold(8.0) < quality_service.rule_score(STRONG_PROMPT)